@@ -26,6 +26,9 @@ class BindingSite:
         self.parent_thin = parent_thin_fil
         self.index = index
         self.address = ('bs', self.parent_thin.index, self.index)
+        # Keep mutable state in the lattice's store
+        self._store = self.parent_thin.parent_lattice.store
+        self._id = self._store.add_site(self)
         # Use the passed orientation index to choose the correct
         # orientation vector according to schema in ThinFilament docstring
         orientation_vectors = ((0.866, -0.5), (0, -1), (-0.866, -0.5),
@@ -61,8 +64,12 @@ class BindingSite:
         bsd = self.__dict__.copy()
         bsd.pop('index')
         bsd.pop('parent_thin')
-        if bsd['bound_to'] is not None:
-            bsd['bound_to'] = bsd['bound_to'].address
+        bsd.pop('_store')
+        bsd.pop('_id')
+        bsd['permissiveness'] = self.permissiveness
+        bsd['bound_to'] = None
+        if self.bound_to is not None:
+            bsd['bound_to'] = self.bound_to.address
         return bsd
 
     def from_dict(self, bsd):
@@ -114,6 +121,30 @@ class BindingSite:
         assert(self.bound_to is not None) # Else why try to unbind?
         self.bound_to = None
 
+    @property
+    def bound_to(self):
+        """The bound cross-bridge, None if unbound"""
+        xb_id = self._store.site_bound[self._id]
+        if xb_id < 0:
+            return None
+        return self._store.xbs[xb_id]
+
+    @bound_to.setter
+    def bound_to(self, crossbridge):
+        """Record the bound cross-bridge (or None) in the store"""
+        xb_id = -1 if crossbridge is None else crossbridge._id
+        self._store.site_bound[self._id] = xb_id
+
+    @property
+    def permissiveness(self):
+        """How open to binding, 0 to 1, this site is"""
+        return self._store.permissiveness[self._id]
+
+    @permissiveness.setter
+    def permissiveness(self, new_permissiveness):
+        """Record the site's permissiveness in the store"""
+        self._store.permissiveness[self._id] = new_permissiveness
+
     @property
     def state(self):
         """Return the current numerical state, 0/unbound or 1/bound"""
@@ -127,7 +158,7 @@ class BindingSite:
     @property
     def axial_location(self):
         """Return the current axial location of the binding site"""
-        return self.parent_thin.axial[self.index]
+        return self._store.site_axial[self._id]
 
 
 class ThinFace:
@@ -156,6 +187,7 @@ class ThinFace:
         self.address = ('thin_face', self.parent_thin.index, self.index)
         self.orientation = orientation
         self.binding_sites = binding_sites
+        self._site_ids = np.array([site._id for site in binding_sites])
         self.thick_face = None  # ThickFace instance this face interacts with
 
     def to_dict(self):
@@ -171,6 +203,7 @@ class ThinFace:
         tfd = self.__dict__.copy()
         tfd.pop('index')
         tfd.pop('parent_thin')
+        tfd.pop('_site_ids')
         tfd['thick_face'] = tfd['thick_face'].address
         tfd['binding_sites'] = [bs.address for bs in tfd['binding_sites']]
         return tfd
@@ -209,7 +242,8 @@ class ThinFace:
         # binding site just beyond the hiding line can be accessed
         hiding_line = self.parent_thin.hiding_line
         axial_location = max(hiding_line, axial_location)
-        face_locs = [site.axial_location for site in self.binding_sites]
+        store = self.parent_thin.parent_lattice.store
+        face_locs = store.site_axial[self._site_ids]
         next_index = np.searchsorted(face_locs, axial_location)
         prev_index = next_index - 1
         # If not using a very short SL, where the end face loc is closest, 
@@ -402,11 +436,14 @@ class ThinFilament:
             self.thin_faces.append(
                 ThinFace(self, orientation, face_index, face_binding_sites))
         del(orientation, face_binding_sites)
-        # Remember the axial locations, both current and rest
-        self.axial = axial_flat
+        # Remember the axial locations, both current and rest, keeping the
+        # current locations in the lattice's store
+        self.parent_lattice.store.add_thin(axial_flat)
         self.rests = np.diff(np.hstack([self.axial, self.z_line]))
         # Other thin filament properties to remember
         self.number_of_nodes = len(self.binding_sites)
+        self._site_ids = slice(self.binding_sites[0]._id,
+                               self.binding_sites[-1]._id + 1)
         self.thick_faces = None # Set after creation of thick filaments
         self.k = 1743
 
@@ -427,9 +464,10 @@ class ThinFilament:
         thind = self.__dict__.copy()
         thind.pop('index')
         thind.pop('parent_lattice') # TODO: Spend a P on an id for the lattice
+        thind.pop('_site_ids')
         thind['thick_faces'] = [tf.address for tf in thind['thick_faces']]
         thind['thin_faces'] = [tf.to_dict() for tf in thind['thin_faces']]
-        thind['axial'] = list(thind['axial'])
+        thind['axial'] = list(self.axial)
         thind['rests'] = list(thind['rests'])
         thind['binding_sites'] = [bs.to_dict() for bs in \
                                   thind['binding_sites']]
@@ -505,11 +543,15 @@ class ThinFilament:
         Returns:
             axial_forces: a list of the XB axial force at each node 
         """
-        if axial_locations == None:
-            axial_forces = [site.axialforce() for site in self.binding_sites]
-        else:
-            axial_forces = [site.axialforce(loc) for
-                    site,loc in zip(self.binding_sites, axial_locations)]
+        # Only bound sites see any force, the store says which those are
+        bound = self.parent_lattice.store.site_bound[self._site_ids] >= 0
+        axial_forces = np.zeros(self.number_of_nodes)
+        for i in np.flatnonzero(bound):
+            if axial_locations is None:
+                axial_forces[i] = self.binding_sites[i].axialforce()
+            else:
+                axial_forces[i] = self.binding_sites[i].axialforce(
+                    axial_locations[i])
         return axial_forces
 
     def axialforce(self, axial_locations=None):
@@ -612,6 +654,18 @@ class ThinFilament:
         assert(len(flat_axial_locs) == len(self.axial))
         self.axial = flat_axial_locs
 
+    @property
+    def axial(self):
+        """Axial locations of the nodes, a view into the lattice's store"""
+        return self.parent_lattice.store.thin_axial[self.index]
+
+    @axial.setter
+    def axial(self, new_axial):
+        """Copy new node locations into the lattice's store"""
+        store = self.parent_lattice.store
+        store.thin_axial[self.index][:] = new_axial
+        store.thin_moved()
+
     @property
     def z_line(self):
         return self.parent_lattice.z_line
@@ -624,13 +678,13 @@ class ThinFilament:
     @property
     def permissiveness(self):
         """Return the permissiveness of each binding site"""
-        return [site.permissiveness for site in self.binding_sites]
+        return self.parent_lattice.store.permissiveness[self._site_ids]
 
     @permissiveness.setter
     def permissiveness(self, new_permissiveness):
         """Assign all binding sites the new permissiveness"""
-        for site in self.binding_sites:
-            site.permissiveness = new_permissiveness
+        self.parent_lattice.store.permissiveness[self._site_ids] = \
+                new_permissiveness
 
     def get_binding_site(self, index):
         """Return a link to the binding site site at index"""
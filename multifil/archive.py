@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+archive.py - Read the JSON sarc files of finished runs a timestep at a time
+
+A JSON sarc file is a list of hs.to_dict, one for each timestep recorded, and
+can run to gigabytes; parsing it whole to get at one timestep takes all of
+that in memory. Each sarcomere dict is written on a line of its own, so a
+SarcJsonReader instead reads the file a line, and so a timestep, at a time.
+The first time a file is read through, the byte offset of each timestep is
+noted in an index kept beside it, FILENAME + INDEX_SUFFIX, so any timestep
+can later be read directly, or loaded into an hs.
+
+Plain .sarc.json files are read, as are those compressed as a run writes
+them (.sarc.json.gz, .sarc.json.xz) and those tarred by earlier versions
+(.sarc.tar.gz). Offsets into compressed files are of the uncompressed JSON;
+reaching one means decompressing everything before it, though reading on
+from the timestep before is quick.
+"""
+
+import os
+import re
+import gzip
+import lzma
+import tarfile
+import numpy as np
+import ujson as json
+from . import hs
+
+## Defaults
+INDEX_SUFFIX = '.index.json'
+INDEX_DTYPE = np.dtype([('timestep', '<i8'), ('offset', '<i8'),
+                        ('length', '<i8')])
+TIMESTEP = re.compile(rb'"current_timestep":(-?\d+)')
+
+
+def open_sarc_json(filename):
+    """Open a JSON sarc file, compressed or not, as a binary file"""
+    if filename.endswith('.tar.gz'):
+        tar = tarfile.open(filename, 'r:gz')
+        return tar.extractfile(tar.getmembers()[0])
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    if filename.endswith('.xz'):
+        return lzma.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def _frame(line):
+    """The sarcomere dict on a line of a JSON sarc file, still encoded, or
+    None if the line is one of the list's brackets"""
+    line = line.strip()
+    if line in (b'', b'[', b']'):
+        return None
+    if line.endswith(b','):
+        line = line[:-1]
+    if not line.startswith(b'{') or not line.endswith(b'}'):
+        raise ValueError("Not a sarcomere dict on a line of its own")
+    return line
+
+
+def _timestep(encoded):
+    """The timestep of an encoded sarcomere dict"""
+    match = TIMESTEP.search(encoded)
+    if match is None:
+        return json.loads(encoded)['current_timestep']
+    return int(match.group(1))
+
+
+class SarcJsonReader:
+    """Read the timesteps of a JSON sarc file in turn or directly"""
+    def __init__(self, filename):
+        """Open the sarc file and read or build its index
+
+        Parameters:
+            filename: the .sarc.json file to read, which may be gzip, xz,
+                or tar.gz compressed
+        """
+        self.filename = filename
+        self.file = open_sarc_json(filename)
+        self.index = self._read_index()
+        if self.index is None:
+            self.index = self._build_index()
+            self._write_index()
+        self.timesteps = self.index['timestep']
+        self.sarc = None # made by the first load
+
+    def _stat(self):
+        """Size and modification time of the sarc file, to tell whether an
+        index was built from it as it is now"""
+        stat = os.stat(self.filename)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _read_index(self):
+        """The index kept beside the sarc file, None if there isn't one or
+        it is out of date"""
+        try:
+            with open(self.filename + INDEX_SUFFIX, 'r') as index_file:
+                kept = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+        if [kept['size'], kept['mtime']] != list(self._stat()):
+            return None
+        return np.array([tuple(entry) for entry in kept['frames']],
+                        dtype=INDEX_DTYPE).reshape(-1)
+
+    def _build_index(self):
+        """Read through the sarc file, noting where each timestep lies"""
+        self.file.seek(0)
+        index = []
+        while True:
+            offset = self.file.tell()
+            line = self.file.readline()
+            if not line:
+                break
+            encoded = _frame(line)
+            if encoded is None:
+                continue
+            offset += line.index(b'{')
+            index.append((_timestep(encoded), offset, len(encoded)))
+        return np.array(index, dtype=INDEX_DTYPE).reshape(-1)
+
+    def _write_index(self):
+        """Keep the index beside the sarc file, if it can be written there"""
+        size, mtime = self._stat()
+        kept = {'size': size, 'mtime': mtime,
+                'frames': self.index.tolist()}
+        try:
+            with open(self.filename + INDEX_SUFFIX, 'w') as index_file:
+                json.dump(kept, index_file)
+        except OSError:
+            pass # a read only archive, the index is kept in memory
+
+    def __len__(self):
+        """Number of timesteps in the sarc file"""
+        return len(self.index)
+
+    def read(self, frame):
+        """The sarcomere dict of a frame, 0 to len(self) - 1"""
+        entry = self.index[frame]
+        self.file.seek(int(entry['offset']))
+        return json.loads(self.file.read(int(entry['length'])))
+
+    def frame_of(self, timestep):
+        """The first frame a timestep was recorded at"""
+        frame = np.searchsorted(self.timesteps, timestep)
+        if frame == len(self) or self.timesteps[frame] != timestep:
+            raise KeyError("Timestep %i was not recorded"%timestep)
+        return int(frame)
+
+    def load(self, frame):
+        """The sarcomere as it was at a frame
+
+        Parameters:
+            frame: index of the frame, 0 to len(self) - 1
+        Returns:
+            sarc: the reader's hs.hs, with the state of that frame; it is
+                reused by the next load, which only restores the state
+                of the lattice rather than rebuilding it
+        """
+        sd = self.read(frame)
+        if self.sarc is not None and self.sarc.same_lattice(sd):
+            self.sarc.restore(sd)
+            return self.sarc
+        # Building a lattice reseeds the random draws, which are the
+        # caller's, so they are left as they were
+        random_state = np.random.get_state()
+        if self.sarc is None:
+            self.sarc = hs.hs()
+        self.sarc.from_dict(sd)
+        np.random.set_state(random_state)
+        return self.sarc
+
+    def __iter__(self):
+        """Each frame's sarcomere dict in turn, read as the file is gone
+        through rather than all at once"""
+        self.file.seek(0)
+        while True:
+            line = self.file.readline()
+            if not line:
+                return
+            encoded = _frame(line)
+            if encoded is not None:
+                yield json.loads(encoded)
+
+    def close(self):
+        """Close the sarc file"""
+        self.file.close()
+
+
+if __name__ == '__main__':
+    print("archive.py is really meant to be called as a supporting module")
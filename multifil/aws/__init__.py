@@ -1,4 +1,16 @@
 from .run import manage
 from .metas import emit 
-from .instance import queue_eater
-from .cluster import watch_cluster
+from .local import run_sweep, run_branches
+
+
+def __getattr__(name):
+    """Import the parts that need AWS, queue_eater and watch_cluster, only
+    when first asked for, so that local runs need no credentials or network
+    """
+    if name == 'queue_eater':
+        from .instance import queue_eater
+        return queue_eater
+    if name == 'watch_cluster':
+        from .cluster import watch_cluster
+        return watch_cluster
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+cache.py - reuse the outputs of runs already carried out
+
+Each meta file emitted gets a fresh name, so a sweep that is set up again
+will have its runs simulated again even where nothing about them has
+changed. A run_cache keeps the output files of finished runs in a local
+directory, keyed by a hash of the meta fields that shape the run. A run that
+matches a cached one, down to its random seed, can copy the cached outputs
+rather than be simulated. Runs without a seed differ each time they are made
+and so are never cached.
+
+The cache is bounded in size; once over, the least recently used entries are
+removed first.
+"""
+
+import os
+import shutil
+import hashlib
+import ujson as json
+
+## Defaults
+# The meta fields read when a run is set up, update when run.manage reads more
+KEYED_FIELDS = ('poisson_ratio', 'lattice_spacing', 'z_line',
+                'actin_permissiveness', 'timestep_length', 'timestep_number',
+                'kinetics', 'rate_table', 'binding', 'settle_method',
+                'settle_stats', 'seed', 'sarc_format', 'keyframe_every',
+                'data_format', 'metrics', 'data_policy', 'sarc_policy',
+                'sarc_compression', 'compression_level')
+# To be updated when changes to the model alter the outputs of a run
+CACHE_VERSION = 2
+MAX_BYTES = 2**32 # 4 GB
+
+
+class run_cache:
+    def __init__(self, directory, max_bytes=None):
+        """Keep the outputs of finished runs in a directory
+
+        Parameters
+        ----------
+        directory: string
+            local directory to keep cached runs in, created if needed
+        max_bytes: int, optional
+            size past which the least recently used entries are removed,
+            defaults to MAX_BYTES
+        """
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        os.makedirs(self.directory, exist_ok=True)
+        if max_bytes is None:
+            max_bytes = MAX_BYTES
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_meta(cls, meta):
+        """The cache a meta file asks for with its 'cache' and
+        'cache_max_bytes' fields, or None if it doesn't"""
+        if meta.get('cache') is None:
+            return None
+        return cls(meta['cache'], meta.get('cache_max_bytes'))
+
+    @staticmethod
+    def key(meta):
+        """Hash of the fields that shape a run, None if it has no seed"""
+        if meta.get('seed') is None:
+            return None
+        keyed = {field: meta.get(field) for field in KEYED_FIELDS}
+        keyed['cache_version'] = CACHE_VERSION
+        canonical = json.dumps(keyed, sort_keys=True)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def fetch(self, meta, working_dir):
+        """Copy a cached run's outputs into the working directory
+
+        Parameters
+        ----------
+        meta: dict
+            the run's meta dictionary
+        working_dir: string
+            directory to copy the outputs to
+
+        Returns
+        -------
+        files: list or None
+            the outputs copied, renamed for this run, or None if this run
+            isn't in the cache
+        """
+        key = self.key(meta)
+        if key is None:
+            return None
+        entry = os.path.join(self.directory, key)
+        try:
+            suffixes = sorted(os.listdir(entry))
+        except FileNotFoundError:
+            return None
+        os.utime(entry) # mark as recently used
+        files = []
+        for suffix in suffixes:
+            cached = os.path.join(entry, suffix)
+            local = os.path.join(working_dir, meta['name'] + suffix)
+            if suffix.endswith('.data.json'):
+                # The data file records the name of the run it came from
+                with open(cached, 'r') as datafile:
+                    data = json.load(datafile)
+                data['name'] = meta['name']
+                with open(local, 'w') as datafile:
+                    json.dump(data, datafile, sort_keys=True)
+            else:
+                shutil.copyfile(cached, local)
+            files.append(local)
+        return files
+
+    def store(self, meta, files):
+        """Cache a finished run's outputs, each named for the run
+
+        Parameters
+        ----------
+        meta: dict
+            the run's meta dictionary
+        files: list
+            the run's output files, each named meta['name'] + a suffix
+        """
+        key = self.key(meta)
+        if key is None:
+            return
+        entry = os.path.join(self.directory, key)
+        if os.path.exists(entry):
+            return
+        # Build the entry aside, then move it in place in one step
+        partial = entry + '.partial-%i'%os.getpid()
+        os.makedirs(partial, exist_ok=True)
+        for fn in files:
+            suffix = os.path.basename(fn)[len(meta['name']):]
+            shutil.copyfile(fn, os.path.join(partial, suffix))
+        try:
+            os.rename(partial, entry)
+        except OSError:
+            shutil.rmtree(partial) # another process cached it first
+        self.evict(keep=key)
+
+    @staticmethod
+    def _size(entry):
+        """Bytes taken by an entry, 0 if another process removed it"""
+        try:
+            return sum(os.path.getsize(os.path.join(entry, fn))
+                       for fn in os.listdir(entry))
+        except FileNotFoundError:
+            return 0
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until under size"""
+        entries = []
+        total = 0
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+            if '.partial-' in key:
+                continue
+            size = self._size(entry)
+            total += size
+            if key != keep and size > 0:
+                entries.append((os.path.getmtime(entry), size, entry))
+        for used, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
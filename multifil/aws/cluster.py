@@ -58,7 +58,9 @@ def get_access_keys(filename=os.path.expanduser('~/.aws/credentials'),
     secret = config.get(section,'aws_secret_access_key')
     return id, secret
 
-def get_bdm(ec2=boto.connect_ec2(), ami=AMI[0], size=HD_SIZE):
+def get_bdm(ec2=None, ami=AMI[0], size=HD_SIZE):
+    if ec2 is None:
+        ec2 = boto.connect_ec2()
     bdm = ec2.get_image(ami).block_device_mapping
     bdm['/dev/sda1'].size = size
     bdm['/dev/sda1'].encrypted = None
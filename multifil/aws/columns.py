@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+columns.py - a memory-mapped columnar file for per-timestep run data
+
+A data file written as JSON has to be held in memory as lists while the run
+goes and parsed whole when read back. A column file instead preallocates a
+fixed-type array for each column, sized for the run's timesteps, and maps
+them from disk. Rows are written in place as the run goes and a reader can
+map just the columns it needs.
+
+A column file is laid out as:
+    MAGIC | rows written, uint64 | header length, uint32 | header, JSON
+    padding to a multiple of 8 bytes, then each column's array in turn, each
+    padded likewise
+The header holds any attributes of the run as a whole and, for each column,
+its name, numpy dtype, and offset from the start of the file.
+"""
+
+import os
+import numpy as np
+import ujson as json
+
+## Defaults
+MAGIC = b'MFCOLS01'
+ROWS_AT = len(MAGIC) # where the row count is kept
+HEADER_AT = ROWS_AT + 8
+
+pad = lambda n: n + (-n) % 8
+
+
+class column_file:
+    def __init__(self, filename, columns=None, capacity=None, attrs=None,
+                 rows=None):
+        """Create a column file, or open one to carry on writing it
+
+        Parameters
+        ----------
+        filename: string
+            where to write the column file
+        columns: list of (name, dtype) pairs
+            the columns to create, not needed to reopen a file
+        capacity: int
+            rows to make room for, not needed to reopen a file
+        attrs: dict, optional
+            JSON compatible attributes of the run as a whole
+        rows: int, optional
+            if given, the file is reopened and writing carries on from this
+            row, rows after it are overwritten
+        """
+        self.filename = filename
+        if rows is None:
+            header = {'attrs': attrs or {}, 'capacity': capacity,
+                      'columns': []}
+            # Lay the columns out after the header, leaving it room for
+            # offsets of any size
+            room = json.dumps(self._layout(header, columns, 10**18))
+            self._layout(header, columns, pad(HEADER_AT + 4 + len(room)))
+            encoded = json.dumps(header).encode()
+            size = header['columns'][-1][2] + pad(
+                capacity * np.dtype(columns[-1][1]).itemsize)
+            self.map = np.memmap(filename, np.uint8, 'w+', shape=(size,))
+            self.map[:len(MAGIC)] = np.frombuffer(MAGIC, np.uint8)
+            self.map[HEADER_AT:HEADER_AT + 4] = np.frombuffer(
+                np.uint32(len(encoded)).tobytes(), np.uint8)
+            self.map[HEADER_AT + 4:HEADER_AT + 4 + len(encoded)] = \
+                    np.frombuffer(encoded, np.uint8)
+            rows = 0
+        else:
+            self.map = np.memmap(filename, np.uint8, 'r+')
+        self.header, self.columns = _map_columns(self.map)
+        self._rows = self.map[ROWS_AT:HEADER_AT].view('<u8')
+        self.rows = rows
+
+    @staticmethod
+    def _layout(header, columns, offset):
+        """Lay out the columns from offset on, recording them in header"""
+        header['columns'] = []
+        for name, dtype in columns:
+            dtype = np.dtype(dtype)
+            header['columns'].append([name, dtype.str, offset])
+            offset += pad(header['capacity'] * dtype.itemsize)
+        return header
+
+    @property
+    def rows(self):
+        """Rows written so far"""
+        return int(self._rows[0])
+
+    @rows.setter
+    def rows(self, rows):
+        """Record the rows written so far"""
+        self._rows[0] = rows
+
+    def append(self, row):
+        """Write a row, a dict of a value for each column. None is written
+        as NaN to float columns."""
+        i = self.rows
+        for name, value in row.items():
+            column = self.columns[name]
+            if value is None:
+                value = np.nan
+            column[i] = value
+        self.rows = i + 1
+
+    def flush(self):
+        """Flush the columns written so far to disk"""
+        self.map.flush()
+
+    def close(self):
+        """Flush the columns to disk and close the file"""
+        self.map.flush()
+        del self.map, self.columns, self._rows
+
+
+def _map_columns(mapped):
+    """Read the header of a mapped column file and view its columns"""
+    if bytes(mapped[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a column file")
+    length = int(mapped[HEADER_AT:HEADER_AT + 4].view('<u4')[0])
+    header = json.loads(bytes(mapped[HEADER_AT + 4:HEADER_AT + 4 + length]))
+    capacity = header['capacity']
+    columns = {}
+    for name, dtype, offset in header['columns']:
+        dtype = np.dtype(dtype)
+        columns[name] = mapped[offset:offset + capacity * dtype.itemsize]\
+                .view(dtype)
+    return header, columns
+
+
+def read_columns(filename, names=None):
+    """Map the columns of a column file, without reading them into memory
+
+    Parameters
+    ----------
+    filename: string
+        the column file to read
+    names: list of strings, optional
+        the columns wanted, defaults to all of them
+
+    Returns
+    -------
+    data: dict
+        each column's rows written, as a read only memory-mapped array,
+        along with the file's attributes and a 'name' taken from the file
+        name, laid out as the dict in a JSON data file
+    """
+    mapped = np.memmap(filename, np.uint8, 'r')
+    header, columns = _map_columns(mapped)
+    rows = int(mapped[ROWS_AT:HEADER_AT].view('<u8')[0])
+    data = dict(header['attrs'])
+    data['name'] = os.path.basename(filename).split('.')[0]
+    if names is None:
+        names = columns.keys()
+    for name in names:
+        data[name] = columns[name][:rows]
+    return data
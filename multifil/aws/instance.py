@@ -26,7 +26,7 @@ try:
     log_to_sqs=True
     sqs = boto.connect_sqs()
     logging_queue = sqs.get_queue('status-queue')
-except urllib.error.URLError:
+except OSError: # no metadata service, so not on an instance
     log_to_sqs=False
 
 
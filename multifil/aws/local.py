@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+local.py - work through a sweep of runs on the local machine
+
+local.run_sweep takes the meta files written by metas.emit and runs each with
+run.manage, as an instance does, but on a bounded pool of local processes and
+with no S3 or SQS involved. Runs that fail are retried and each run's outcome
+is summarized once the sweep is done.
+
+local.run_branches does the same for runs that only differ after some number
+of timesteps, such as force-velocity or workloop runs that share an isometric
+hold or activation: the shared timesteps are simulated once, as a prefix run
+stopped at a checkpoint, and each run carries on from there.
+"""
+
+import sys
+import os
+import glob
+import time
+import uuid
+import shutil
+import tempfile
+import traceback
+import optparse
+import ujson as json
+import multiprocessing as mp
+from . import run
+from . import cache
+
+## Defaults
+# Meta fields that runs must share to be branched from one prefix, besides
+# the z-line and permissiveness traces, which need only share the prefix
+BRANCH_FIELDS = tuple(field for field in cache.KEYED_FIELDS if field not in
+                      ('z_line', 'actin_permissiveness', 'timestep_number'))
+
+
+## Helper functions
+def log_it(log_message):
+    """Print message to sys.stdout"""
+    sys.stdout.write("local.py ## " + log_message + "\n")
+    sys.stdout.flush()
+
+def find_metafiles(location):
+    """Return the meta files in a directory, or the list of files passed"""
+    if isinstance(location, str):
+        if os.path.isdir(location):
+            return sorted(glob.glob(os.path.join(location, '*.meta.json')))
+        return [location]
+    return list(location)
+
+def _run_job(metafile, prefix=None):
+    """Run a single meta file, carrying on from a prefix run's meta file if
+    given, returning (error, seconds taken)"""
+    tic = time.time()
+    try:
+        manager = run.manage(metafile, unattended=False)
+        if prefix is not None:
+            manager.branch_from(prefix)
+        manager.run_and_save()
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return error, time.time() - tic
+
+def _send_job(connection, metafile, prefix=None):
+    """Run a single meta file in a process of its own, sending the outcome
+    of _run_job back over the connection"""
+    connection.send(_run_job(metafile, prefix))
+    connection.close()
+
+def _job_outcome(process, connection, tic, timeout=None):
+    """The (error, seconds taken) of a job's process, or None if it is
+    still running. A process that died without sending its outcome, or
+    that ran past the timeout and was stopped, counts as a failure."""
+    alive = process.is_alive()
+    if connection.poll():
+        try:
+            return connection.recv()
+        except EOFError:
+            alive = False
+    if not alive:
+        return ("Worker process exited with code %s before finishing"%(
+            process.exitcode), time.time() - tic)
+    if timeout is not None and time.time() - tic > timeout:
+        process.terminate()
+        return ("Worker process stopped after the %is timeout"%timeout,
+                time.time() - tic)
+    return None
+
+
+## Work through the sweep
+def run_sweep(metafiles, processes=None, retries=1, report=log_it,
+              prefix=None, timeout=None):
+    """Run each meta file on a pool of local processes
+
+    Parameters:
+        metafiles: a directory of .meta.json files, or a list of meta files
+        processes: most runs to carry out at once (defaults to cpu count)
+        retries: times to rerun a failed run before giving up on it (1)
+        report: function called with a progress message as each attempt
+            finishes, or None for quiet (defaults to printing the message)
+        prefix: meta file of a prefix run for each run to carry on from,
+            see run_branches (None)
+        timeout: seconds a run may take before it is stopped and counted
+            as failed (None, no limit)
+    Returns:
+        summary: a dict for each meta file, in the order given, with the
+            keys metafile, name, status ('done' or 'failed'), attempts,
+            seconds (taken by the last attempt), and error (the traceback
+            of the last failure, or None). A run whose process was killed
+            or timed out fails with a note of that as its error.
+    """
+    metafiles = find_metafiles(metafiles)
+    if processes is None:
+        processes = mp.cpu_count()
+    summary = [{'metafile': mf,
+                'name': os.path.basename(mf).split('.')[0],
+                'status': None,
+                'attempts': 0,
+                'seconds': None,
+                'error': None} for mf in metafiles]
+    finished = 0
+    # A fresh process for each run, as the instance queue eaters use, so
+    # that one which dies is known and the others carry on
+    waiting = list(summary)
+    running = []
+    try:
+        while waiting or running:
+            while waiting and len(running) < processes:
+                job = waiting.pop(0)
+                receive, send = mp.Pipe(False)
+                process = mp.Process(target=_send_job,
+                                     args=(send, job['metafile'], prefix))
+                process.start()
+                send.close()
+                running.append((job, process, receive, time.time()))
+            time.sleep(0.1)
+            still_running = []
+            for job, process, receive, tic in running:
+                outcome = _job_outcome(process, receive, tic, timeout)
+                if outcome is None:
+                    still_running.append((job, process, receive, tic))
+                    continue
+                process.join()
+                receive.close()
+                job['error'], job['seconds'] = outcome
+                job['attempts'] += 1
+                took = int(job['seconds'])
+                took = "%ih%im%is"%(took/60/60, took/60%60, took%60)
+                if job['error'] is not None and job['attempts'] <= retries:
+                    msg = "%s failed after %s, retrying"%(job['name'], took)
+                    waiting.append(job)
+                else:
+                    job['status'] = 'failed' if job['error'] else 'done'
+                    finished += 1
+                    msg = "%i/%i finished, %s %s after %s"%(
+                        finished, len(summary), job['name'], job['status'],
+                        took)
+                if report is not None:
+                    report(msg)
+            running = still_running
+    finally:
+        # Leave no runs going if the sweep itself is stopped
+        for job, process, receive, tic in running:
+            process.terminate()
+            process.join()
+    return summary
+
+
+## Branch runs from their shared timesteps
+def check_prefix(metas, steps):
+    """Raise a ValueError unless the runs are set up alike and follow the
+    same protocol for their first steps timesteps"""
+    first = metas[0]
+    for meta in metas:
+        if meta['timestep_number'] < steps:
+            raise ValueError("%s has fewer than %i timesteps"%(
+                meta['name'], steps))
+        differ = [field for field in BRANCH_FIELDS
+                  if meta.get(field) != first.get(field)]
+        for field in ('z_line', 'actin_permissiveness'):
+            trace, first_trace = meta[field], first[field]
+            if isinstance(trace, list) and isinstance(first_trace, list):
+                trace, first_trace = trace[:steps], first_trace[:steps]
+            if trace != first_trace:
+                differ.append(field)
+        if differ:
+            raise ValueError("%s differs from %s in %s"%(
+                meta['name'], first['name'], ", ".join(differ)))
+
+def run_branches(metafiles, steps, processes=None, retries=1,
+                 report=log_it, timeout=None):
+    """Simulate the timesteps that runs share once, then carry each run on
+    from there on a pool of local processes
+
+    The runs must be set up alike, down to their seed and what they
+    record, and follow the same z-line and permissiveness traces for
+    their first steps timesteps, see check_prefix. Those timesteps are
+    simulated as a prefix run, stopped with a checkpoint, from which each
+    run is set up by run.manage.branch_from. Seeded runs give the outputs
+    they would have run from the start; unseeded runs draw afresh after
+    the prefix.
+
+    Parameters:
+        metafiles: a directory of .meta.json files, or a list of meta files
+        steps: the number of timesteps the runs share
+        processes, retries, report, timeout: as for run_sweep
+    Returns:
+        summary: as for run_sweep
+    """
+    metafiles = find_metafiles(metafiles)
+    metas = [run.manage.unpack_meta(mf) for mf in metafiles]
+    check_prefix(metas, steps)
+    # The prefix is the first run, renamed and stopping after the steps
+    prefix = dict(metas[0])
+    prefix.update({'name': str(uuid.uuid1()), 'path_local': None,
+                   'path_s3': None, 'cache': None})
+    prefix_dir = tempfile.mkdtemp()
+    prefix_metafile = os.path.join(prefix_dir, prefix['name'] + '.meta.json')
+    with open(prefix_metafile, 'w') as metafile:
+        json.dump(prefix, metafile, indent=4)
+    try:
+        tic = time.time()
+        manager = run.manage(prefix_metafile, unattended=False)
+        manager.run_and_save(stop=steps)
+        if report is not None:
+            report("simulated %i shared timesteps in %is, branching %i runs"%(
+                steps, time.time() - tic, len(metafiles)))
+        return run_sweep(metafiles, processes, retries, report,
+                         prefix_metafile, timeout)
+    finally:
+        shutil.rmtree(prefix_dir, ignore_errors=True)
+        shutil.rmtree(run.manage._make_working_dir(prefix['name']),
+                      ignore_errors=True)
+
+
+## Our main man
+def main(argv=None):
+    ## Get our args from the command line if not passed directly
+    if argv is None:
+        argv = sys.argv[1:]
+    ## Parse arguments into values
+    parser = optparse.OptionParser(
+        "Usage: local.py [options] metadir_or_metafiles...")
+    parser.add_option('-p', '--processes', dest="processes",
+                      default=None, type='int',
+                      help='most runs to carry out at once [cpu count]')
+    parser.add_option('-r', '--retries', dest="retries",
+                      default=1, type='int',
+                      help='times to retry a failed run [1]')
+    parser.add_option('-b', '--branch', dest="branch",
+                      default=None, type='int',
+                      help='timesteps the runs share, to simulate once and '
+                      'branch each run from [none]')
+    parser.add_option('-t', '--timeout', dest="timeout",
+                      default=None, type='float',
+                      help='seconds a run may take before it is stopped '
+                      'and counted as failed [no limit]')
+    (options, args) = parser.parse_args(argv)
+    if len(args) == 1:
+        args = args[0]
+    if options.branch is not None:
+        summary = run_branches(args, options.branch, options.processes,
+                               options.retries, timeout=options.timeout)
+    else:
+        summary = run_sweep(args, options.processes, options.retries,
+                            timeout=options.timeout)
+    for job in summary:
+        print("%s\t%s\t%i attempt(s)"%(job['name'], job['status'],
+                                       job['attempts']))
+    failed = [job for job in summary if job['status'] != 'done']
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -171,7 +171,23 @@ def emit(path_local, path_s3, time,  poisson=0.0, ls=None, z_line=None,
         are used to sort the resulting runs by their properties of interest.
         For example, where we are varying phase of activation across a series
         of runs we would include the argument, e.g. 'phase=0.2', in order to
-        sort over phase when looking at results.
+        sort over phase when looking at results. Some are also read when
+        the run is set up:
+            kinetics, rate_table, binding, settle_method, seed -- for hs.hs
+            settle_stats -- True to record each settle's cost
+            cache -- directory of cached seeded runs, see cache.run_cache
+            cache_max_bytes -- size the cache is kept under
+            checkpoint_every -- timesteps between checkpoints to resume from
+            sarc_format -- "trajectory" for a trajectory.py file, not JSON
+            keyframe_every -- timesteps between trajectory keyframes
+            data_format -- "columns" for a columns.py file, not JSON
+            metrics -- data file columns, see metrics.METRICS
+            data_policy -- timesteps recorded, see metrics.record_policy
+            sarc_policy -- the same, for the sarc file
+            sarc_compression -- "gzip" (default) or "xz"
+            compression_level -- of the sarc compression (6)
+            sarc_writer -- "background" to write sarc JSON on a thread
+            sarc_queue -- most timesteps the background writer lags
 
     Returns
     -------
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+metrics.py - the values recorded of a run at each timestep
+
+Each metric is a column of a run's data file, found from the half-sarcomere
+after a timestep. Metrics are found from intermediates, such as the forces of
+the bound cross-bridges, that several metrics share; a recorder finds each
+intermediate at most once a timestep, and only if a metric it was asked for
+needs it. A run that records only the axial force pays for nothing else.
+
+Which metrics a run records are set by its meta, see metas.emit. Which
+timesteps are recorded, to the data file and to the sarc file, is set by a
+record_policy for each: every so many timesteps, only within windows of time,
+and whenever a metric crosses a threshold.
+"""
+
+import itertools
+import collections
+import numpy as np
+
+chain = itertools.chain.from_iterable
+
+## Intermediates, each found from the sarc and the step's other intermediates
+INTERMEDIATES = {
+    'xb_forces': lambda sarc, get: sarc._bound_xb_forces(),
+    'radial_force': lambda sarc, get: sarc.radialforce(get('xb_forces')),
+    'xb_fractions': lambda sarc, get: sarc.get_frac_in_states(),
+    'transitions': lambda sarc, get: collections.Counter(
+        chain(chain(sarc.last_transitions))),
+    'thick_displace': lambda sarc, get: (
+        np.diff(sarc.store.thick_axial, axis=1, prepend=0) -
+        np.array([thick.rests for thick in sarc.thick])),
+    'thin_displace': lambda sarc, get: (
+        np.diff(sarc.store.thin_axial, axis=1, append=np.full(
+            (len(sarc.thin), 1), sarc.z_line)) -
+        np.array([thin.rests for thin in sarc.thin])),
+}
+
+## Metrics, each a column name, the type it is kept as in a column file, and
+## how it is found from the sarc and the step's intermediates
+METRICS = (
+    ('timestep', 'i8', lambda sarc, get: sarc.current_timestep),
+    ('z_line', 'f8', lambda sarc, get: sarc.z_line),
+    ('lattice_spacing', 'f8', lambda sarc, get: sarc.lattice_spacing),
+    ('axial_force', 'f8', lambda sarc, get: sarc.axialforce()),
+    ('radial_force_y', 'f8', lambda sarc, get: get('radial_force')[0]),
+    ('radial_force_z', 'f8', lambda sarc, get: get('radial_force')[1]),
+    ('radial_tension', 'f8',
+     lambda sarc, get: sarc.radialtension(get('xb_forces'))),
+    ('xb_fraction_free', 'f8', lambda sarc, get: get('xb_fractions')[0]),
+    ('xb_fraction_loose', 'f8', lambda sarc, get: get('xb_fractions')[1]),
+    ('xb_fraction_tight', 'f8', lambda sarc, get: get('xb_fractions')[2]),
+    ('xb_trans_12', 'i4', lambda sarc, get: get('transitions')['12']),
+    ('xb_trans_23', 'i4', lambda sarc, get: get('transitions')['23']),
+    ('xb_trans_31', 'i4', lambda sarc, get: get('transitions')['31']),
+    ('xb_trans_21', 'i4', lambda sarc, get: get('transitions')['21']),
+    ('xb_trans_32', 'i4', lambda sarc, get: get('transitions')['32']),
+    ('xb_trans_13', 'i4', lambda sarc, get: get('transitions')['13']),
+    ('xb_trans_static', 'i4', lambda sarc, get: get('transitions')[None]),
+    ('bind_rejection_rate', 'f8',
+     lambda sarc, get: sarc.bind_rejection_rate),
+    ('actin_permissiveness', 'f8',
+     lambda sarc, get: np.mean(sarc.actin_permissiveness)),
+    ('thick_displace_mean', 'f8',
+     lambda sarc, get: np.mean(get('thick_displace'))),
+    ('thick_displace_max', 'f8',
+     lambda sarc, get: np.max(get('thick_displace'))),
+    ('thick_displace_min', 'f8',
+     lambda sarc, get: np.min(get('thick_displace'))),
+    ('thick_displace_std', 'f8',
+     lambda sarc, get: np.std(get('thick_displace'))),
+    ('thin_displace_mean', 'f8',
+     lambda sarc, get: np.mean(get('thin_displace'))),
+    ('thin_displace_max', 'f8',
+     lambda sarc, get: np.max(get('thin_displace'))),
+    ('thin_displace_min', 'f8',
+     lambda sarc, get: np.min(get('thin_displace'))),
+    ('thin_displace_std', 'f8',
+     lambda sarc, get: np.std(get('thin_displace'))),
+    # The cost of the last settle, not recorded unless asked for
+    ('settle_sweeps', 'i4', lambda sarc, get: sarc.last_settle['sweeps']),
+    ('settle_solves', 'i4', lambda sarc, get: sarc.last_settle['solves']),
+    ('settle_residual', 'f8',
+     lambda sarc, get: sarc.last_settle['residual']),
+    ('settle_time', 'f8', lambda sarc, get: sarc.last_settle['time']),
+)
+FIND = dict([(name, find) for name, dtype, find in METRICS])
+SETTLE_METRICS = ('settle_sweeps', 'settle_solves', 'settle_residual',
+                  'settle_time')
+DEFAULT_METRICS = tuple(name for name, dtype, find in METRICS
+                        if name not in SETTLE_METRICS)
+
+
+def measure(sarc):
+    """A function giving each intermediate or metric of the sarc's current
+    state, found when first asked for and kept for any later asks"""
+    found = {}
+    def get(name):
+        """An intermediate or metric, found if not already"""
+        if name not in found:
+            find = INTERMEDIATES[name] if name in INTERMEDIATES else FIND[name]
+            found[name] = find(sarc, get)
+        return found[name]
+    return get
+
+
+class record_policy:
+    def __init__(self, every=None, windows=None, trigger=None):
+        """Choose which timesteps of a run are recorded
+
+        A timestep is recorded if it is a multiple of every and within one
+        of the windows, or if it was captured by the trigger.
+
+        Parameters
+        ----------
+        every: int, optional
+            record the timesteps that are a multiple of this, defaults to 1
+        windows: list of (start, stop) pairs, optional
+            times in ms, record only timesteps within one of these, from
+            start up to but not including stop, defaults to all timesteps
+        trigger: dict, optional
+            capture timesteps when a metric crosses a threshold, with keys
+            'metric', the name of the metric, 'value', the threshold, and
+            optionally 'steps', the number of timesteps to capture from the
+            crossing on (1)
+        """
+        if every is None:
+            every = 1
+        if trigger is not None and trigger['metric'] not in FIND:
+            raise KeyError("Unknown trigger metric: " + trigger['metric'])
+        self.every = every
+        self.windows = windows
+        self.trigger = trigger
+        # The trigger's state: the metric's last value and the timesteps
+        # left to capture
+        self.last = None
+        self.remaining = 0
+
+    @classmethod
+    def from_dict(cls, policy):
+        """A policy from a dict of its parameters, such as a meta's
+        'data_policy' or 'sarc_policy'; None gives the default policy"""
+        if policy is None:
+            policy = {}
+        return cls(policy.get('every'), policy.get('windows'),
+                   policy.get('trigger'))
+
+    def most_rows(self, timesteps, timestep_length):
+        """The most of a run's timesteps that could be recorded"""
+        if self.trigger is not None:
+            return timesteps
+        return sum([self._scheduled(i, timestep_length)
+                    for i in range(timesteps)])
+
+    def _scheduled(self, timestep, timestep_length):
+        """Whether a timestep is on the stride and within a window"""
+        if timestep % self.every != 0:
+            return False
+        if self.windows is None:
+            return True
+        time = timestep * timestep_length
+        return any([start <= time < stop for start, stop in self.windows])
+
+    def due(self, sarc, get=None):
+        """Whether the sarc's current timestep is one to record, to be
+        asked once a timestep as the trigger keeps track of its metric
+
+        Parameters
+        ----------
+        sarc: hs.hs
+            the half-sarcomere, after its timestep
+        get: function, optional
+            the timestep's measure(sarc), so that the trigger's metric is
+            shared with what records the timestep, defaults to a new one
+        """
+        captured = False
+        if self.trigger is not None:
+            if get is None:
+                get = measure(sarc)
+            value = get(self.trigger['metric'])
+            threshold = self.trigger['value']
+            if None not in (self.last, value) and \
+               (self.last < threshold) != (value < threshold):
+                self.remaining = self.trigger.get('steps', 1)
+            self.last = value
+            if self.remaining > 0:
+                self.remaining -= 1
+                captured = True
+        return captured or self._scheduled(sarc.current_timestep,
+                                           sarc.timestep_len)
+
+    def state(self):
+        """The trigger's state, for set_state to carry on from"""
+        last = None if self.last is None else float(self.last)
+        return {'last': last, 'remaining': self.remaining}
+
+    def set_state(self, state):
+        """Carry on from the state of an earlier policy"""
+        self.last = state['last']
+        self.remaining = state['remaining']
+
+
+class recorder:
+    def __init__(self, sarc, names=None, policy=None):
+        """Record the chosen metrics of a sarc at the timesteps a policy
+        chooses
+
+        Parameters
+        ----------
+        sarc: hs.hs
+            the half-sarcomere to record
+        names: list of strings, optional
+            the metrics to record, defaults to DEFAULT_METRICS
+        policy: record_policy, optional
+            which timesteps to record, defaults to all of them
+        """
+        if names is None:
+            names = DEFAULT_METRICS
+        unknown = set(names) - set(FIND)
+        if len(unknown) > 0:
+            raise KeyError("Unknown metrics: " + ", ".join(sorted(unknown)))
+        if policy is None:
+            policy = record_policy()
+        self.sarc = sarc
+        self.policy = policy
+        # Keep to the order of METRICS, whatever the order asked for
+        self.metrics = [(name, dtype, find) for name, dtype, find in METRICS
+                        if name in names]
+        self.columns = [(name, dtype) for name, dtype, find in self.metrics]
+        # The timestep due was last asked at and its measure, shared with
+        # record
+        self._measured = (None, None)
+
+    @classmethod
+    def from_meta(cls, sarc, meta):
+        """The recorder a meta asks for with its 'metrics', 'data_policy',
+        and 'settle_stats' fields"""
+        names = meta.get('metrics')
+        if names is None:
+            names = DEFAULT_METRICS
+            if meta.get('settle_stats'):
+                names += SETTLE_METRICS
+        return cls(sarc, names,
+                   record_policy.from_dict(meta.get('data_policy')))
+
+    def rows(self, timesteps):
+        """The most of a run's timesteps that could be recorded"""
+        return self.policy.most_rows(timesteps, self.sarc.timestep_len)
+
+    def due(self):
+        """Whether the sarc's current timestep is one to record"""
+        get = measure(self.sarc)
+        self._measured = (self.sarc.current_timestep, get)
+        return self.policy.due(self.sarc, get)
+
+    def record(self):
+        """The metrics of the sarc's current state, as a dict by name,
+        sharing what due found of it this timestep"""
+        timestep, get = self._measured
+        if timestep != self.sarc.current_timestep:
+            get = measure(self.sarc)
+        return {name: get(name) for name, dtype, find in self.metrics}
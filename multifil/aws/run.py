@@ -19,14 +19,22 @@ Created by Dave Williams on 2016-07-02
 import sys
 import os
 import shutil
-import subprocess
 import time
+import gzip
+import lzma
 import ujson as json
 import multiprocessing as mp
+import threading
+import queue
 import boto
 import numpy as np
 
 from .. import hs
+from .. import trajectory
+from .. import archive
+from . import cache
+from . import columns
+from . import metrics
 
 ## Manage a local run
 class manage:
@@ -49,6 +57,9 @@ class manage:
         self.working_dir = self._make_working_dir(self.uuid)
         self.metafile = self._parse_metafile_location(metafile)
         self.meta = self.unpack_meta(self.metafile)
+        self.checkpoint_filename = (self.working_dir + '/' +
+                                    self.meta['name'] + '.checkpoint.json')
+        self._pull_checkpoint()
         self.sarc = self.unpack_meta_to_sarc(self.meta)
         if unattended:
             try:
@@ -101,6 +112,11 @@ class manage:
             actin_permissiveness = actin_permissiveness,
             timestep_len = meta['timestep_length'],
             time_dependence = time_dep_dict,
+            kinetics = meta.get('kinetics'),
+            rate_table = meta.get('rate_table'),
+            binding = meta.get('binding'),
+            settle_method = meta.get('settle_method'),
+            seed = meta.get('seed'),
             )
         return sarc
 
@@ -134,32 +150,221 @@ class manage:
                     + file_name
             shutil.copyfile(temp_loc, local_loc)
 
-    def run_and_save(self):
+    def run_and_save(self, stop=None):
         """Complete a run according to the loaded meta configuration and save
-        results to meta-specified s3 and local locations"""
-        # Initialize data and sarc
-        self.sarcfile = sarc_file(self.sarc, self.meta, self.working_dir)
-        self.datafile = data_file(self.sarc, self.meta, self.working_dir)
+        results to meta-specified s3 and local locations
+
+        Parameters
+        ----------
+        stop: int, optional
+            if given, stop before this timestep rather than finishing the
+            run, leaving a checkpoint and the working files as they stand
+            for other runs to carry on from, see branch_from
+        """
+        # Reuse the outputs of an identical earlier run if there are any
+        self.cache = cache.run_cache.from_meta(self.meta)
+        if self.cache is not None and stop is None:
+            cached = self.cache.fetch(self.meta, self.working_dir)
+            if cached is not None:
+                self._log_it("found in cache, copying")
+                self._copy_file_to_final_location(self.metafile)
+                for cached_name in cached:
+                    self._copy_file_to_final_location(cached_name)
+                    os.remove(cached_name)
+                # Nor is anything left to resume, as by branch_from
+                self._clear_checkpoint()
+                self._log_it("copying finished, done with this run")
+                return
+        # Initialize data and sarc, from a checkpoint if one was left
+        checkpoint = self._load_checkpoint()
+        if checkpoint is None:
+            first_timestep = 0
+            self.sarcfile = sarc_file(self.sarc, self.meta, self.working_dir)
+            self.datafile = data_file(self.sarc, self.meta, self.working_dir)
+            # Seed afresh unless the sarc was seeded for repeatability
+            if self.meta.get('seed') is None:
+                np.random.seed()
+        else:
+            first_timestep = checkpoint['timestep'] + 1
+            # Load in place where the lattice was built the same way
+            if self.sarc.same_lattice(checkpoint['sarc']):
+                self.sarc.restore(checkpoint['sarc'])
+            else:
+                self.sarc.from_dict(checkpoint['sarc'])
+            self.sarc.set_random_state(checkpoint['random_state'])
+            self.sarcfile = sarc_file(self.sarc, self.meta, self.working_dir,
+                                      checkpoint['sarc_offset'])
+            self.datafile = data_file(self.sarc, self.meta, self.working_dir,
+                                      checkpoint['data'])
+            self.datafile.recorder.policy.set_state(checkpoint['policies'][0])
+            self.sarcfile.policy.set_state(checkpoint['policies'][1])
+            self._log_it("resuming from checkpoint at step %i"%first_timestep)
         # Run away
-        np.random.seed()
+        every = self.meta.get('checkpoint_every')
+        last_timestep = self.meta['timestep_number'] if stop is None else stop
         tic = time.time()
-        for timestep in range(self.meta['timestep_number']):
+        for timestep in range(first_timestep, last_timestep):
             self.sarc.timestep(timestep)
             self.datafile.append()
             self.sarcfile.append()
             # Update on how it is going
             self._run_status(timestep, tic, 100)
+            if every and (timestep + 1) % every == 0:
+                self._save_checkpoint(timestep)
+        if stop is not None:
+            self._save_checkpoint(stop - 1)
+            self.datafile.close()
+            self.sarcfile.close()
+            self._log_it("stopped before step %i, checkpoint left"%stop)
+            return
         # Finalize and save files to final locations
         self._log_it("model finished, uploading")
         self._copy_file_to_final_location(self.metafile)
         data_final_name = self.datafile.finalize()
         self._copy_file_to_final_location(data_final_name)
-        self.datafile.delete() # clean up temp files
         sarc_final_name = self.sarcfile.finalize()
         self._copy_file_to_final_location(sarc_final_name)
+        if self.cache is not None:
+            self.cache.store(self.meta, [data_final_name, sarc_final_name])
+        self.datafile.delete() # clean up temp files
         self.sarcfile.delete() # clean up temp files
+        self._clear_checkpoint()
         self._log_it("uploading finished, done with this run")
 
+    def _save_checkpoint(self, timestep):
+        """Record what is needed to resume the run after this timestep: the
+        sarc and random state, the data so far, and the sarc file's length"""
+        checkpoint = {
+            'timestep': timestep,
+            'sarc': self.sarc.to_dict(),
+            'random_state': self.sarc.get_random_state(),
+            'data': self.datafile.checkpoint(),
+            'sarc_offset': self.sarcfile.offset(),
+            'policies': [self.datafile.recorder.policy.state(),
+                         self.sarcfile.policy.state()],
+        }
+        self._write_checkpoint(checkpoint)
+        self._push_checkpoint()
+
+    def _write_checkpoint(self, checkpoint):
+        """Write a checkpoint for this run to pick up from"""
+        # Write aside then move into place so a checkpoint is never partial
+        partial_filename = self.checkpoint_filename + '.partial'
+        with open(partial_filename, 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(partial_filename, self.checkpoint_filename)
+
+    def _checkpoint_files(self):
+        """The checkpoint and the working files it points into"""
+        files = [self.checkpoint_filename,
+                 sarc_file.working_name(self.meta, self.working_dir)]
+        if self.meta.get('data_format') == 'columns':
+            files.append(data_file.columns_name(self.meta, self.working_dir))
+        return files
+
+    def _remote_checkpoint(self):
+        """Where on S3 the checkpoint is kept, beside the run's outputs, or
+        None if the run isn't saved to S3"""
+        if self.meta['path_s3'] is None:
+            return None
+        return self.meta['path_s3'].rstrip('/') + '/checkpoints'
+
+    def _push_checkpoint(self):
+        """Copy the checkpoint and the working files it points into to S3,
+        so that the run can be resumed on another instance"""
+        remote = self._remote_checkpoint()
+        if remote is None:
+            return
+        # The checkpoint last, as it is what marks the others as complete
+        for filename in self._checkpoint_files()[::-1]:
+            self.s3.push_to_s3(filename, remote)
+
+    def _pull_checkpoint(self):
+        """Fetch a checkpoint left on S3 by an earlier attempt at this run,
+        along with the working files it points into, unless there is one
+        here already"""
+        remote = self._remote_checkpoint()
+        if remote is None or os.path.exists(self.checkpoint_filename):
+            return
+        names = [remote + '/' + os.path.basename(filename)
+                 for filename in self._checkpoint_files()]
+        if not all([self.s3.exists_on_s3(name) for name in names]):
+            return
+        self._log_it("fetching checkpoint from s3")
+        # The working files first, so a partial fetch leaves no checkpoint
+        for name in names[::-1]:
+            self.s3.pull_from_s3(name, self.working_dir)
+
+    def _delete_remote_checkpoint(self):
+        """Remove the checkpoint and its working files from S3"""
+        remote = self._remote_checkpoint()
+        if remote is None:
+            return
+        for filename in self._checkpoint_files():
+            self.s3.delete_from_s3(remote + '/' + os.path.basename(filename))
+
+    def _clear_checkpoint(self):
+        """Remove the checkpoint and the working files it points into,
+        here and on S3, once the run is done"""
+        for filename in self._checkpoint_files():
+            if os.path.exists(filename):
+                os.remove(filename)
+        self._delete_remote_checkpoint()
+
+    def _load_checkpoint(self):
+        """Load the checkpoint left by an earlier attempt at this run, if
+        there is one that the sarc file written so far can resume from"""
+        if not os.path.exists(self.checkpoint_filename):
+            return None
+        with open(self.checkpoint_filename, 'r') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        sarc_filename = sarc_file.working_name(self.meta, self.working_dir)
+        if not os.path.exists(sarc_filename) or \
+           os.path.getsize(sarc_filename) < checkpoint['sarc_offset']:
+            self._log_it("sarc file shorter than checkpoint, starting over")
+            return None
+        return checkpoint
+
+    def branch_from(self, prefix_metafile):
+        """Set this run up to carry on from a prefix run, as though it had
+        been checkpointed where the prefix was stopped
+
+        The prefix is a run of the same setup and protocol as this one up
+        to where it was stopped by run_and_save(stop). Its working files
+        and checkpoint are copied for this run, with this run's name and
+        time dependence in place of the prefix's, so that run_and_save
+        carries on from there as it would resume from a checkpoint.
+
+        Parameters
+        ----------
+        prefix_metafile: string
+            local meta file of the prefix run
+        """
+        prefix_meta = self.unpack_meta(prefix_metafile)
+        prefix_dir = self._make_working_dir(prefix_meta['name'])
+        with open(prefix_dir + '/' + prefix_meta['name'] +
+                  '.checkpoint.json', 'r') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        # The protocol recorded is this run's, not the prefix's
+        prefix_time_dependence = checkpoint['sarc']['time_dependence']
+        checkpoint['sarc']['time_dependence'] = self.sarc.time_dependence
+        checkpoint['sarc_offset'] = sarc_file.branch(
+            prefix_meta, prefix_dir, checkpoint['sarc_offset'],
+            self.meta, self.working_dir,
+            prefix_time_dependence, self.sarc.time_dependence)
+        checkpoint['data'] = data_file.branch(
+            prefix_meta, prefix_dir, checkpoint['data'],
+            self.sarc, self.meta, self.working_dir)
+        # Draw afresh from here unless seeded for repeatability, as a run
+        # of its own would
+        if self.meta.get('seed') is None:
+            np.random.seed()
+            random_state = self.sarc.get_random_state()
+            random_state['tip_acceptance'] = \
+                    checkpoint['random_state']['tip_acceptance']
+            checkpoint['random_state'] = random_state
+        self._write_checkpoint(checkpoint)
+
     def _run_status(self, timestep, start, every):
         """Report the run status"""
         if timestep%every==0 or timestep==0:
@@ -178,36 +383,241 @@ class manage:
         sys.stdout.flush()
 
 ## File management
+class background_writer:
+    def __init__(self, write, depth=None):
+        """Pass each item put to write, in turn, on a thread of its own
+
+        Parameters
+        ----------
+        write: function
+            called with each item put
+        depth: int, optional
+            most items left waiting to be written before put blocks until
+            the writer catches up, defaults to 8
+        """
+        if depth is None:
+            depth = 8
+        self.write = write
+        self.queue = queue.Queue(depth)
+        self.error = None
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+    def _work(self):
+        """Write items as they arrive, until told to stop"""
+        while True:
+            item = self.queue.get()
+            try:
+                if item is not None and self.error is None:
+                    self.write(item)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+            if item is None:
+                return
+
+    def _raise(self):
+        """Pass on any error from the writer thread"""
+        if self.error is not None:
+            raise self.error
+
+    def put(self, item):
+        """Hand an item to the writer, waiting if it is too far behind"""
+        self._raise()
+        self.queue.put(item)
+
+    def wait(self):
+        """Wait until every item put has been written"""
+        self.queue.join()
+        self._raise()
+
+    def close(self):
+        """Write what is left and stop the writer thread"""
+        self.queue.put(None)
+        self.thread.join()
+        self._raise()
+
+
+# Values of a sarc's to_dict that aren't held in its snapshots, or are held
+# only as floats
+SARC_RECORDS = ('last_transitions', 'bind_rejection_rate', 'last_settle',
+                '_z_line', '_lattice_spacing', 'hiding_line')
+# Compressors for JSON sarc files, by the meta's 'sarc_compression', each a
+# file suffix and a function giving a stream to write over an open file.
+# Gzip headers are left without a name or time, so that the same run gives
+# the same bytes however it is written.
+SARC_COMPRESSORS = {
+    'gzip': ('.gz', lambda raw, level: gzip.GzipFile(
+        filename='', fileobj=raw, mode='wb', compresslevel=level, mtime=0)),
+    'xz': ('.xz', lambda raw, level: lzma.LZMAFile(
+        raw, 'wb', preset=level)),
+}
+COMPRESSION_LEVEL = 6
+
 class sarc_file:
-    def __init__(self, sarc, meta, working_dir):
-        """Handles recording a sarcomere dict to disk at each timestep"""
+    def __init__(self, sarc, meta, working_dir, offset=None):
+        """Handles recording the sarcomere to disk at each timestep, as a
+        JSON list of sarcomere dicts or, if the meta's 'sarc_format' is
+        'trajectory', as a trajectory file of keyframes and deltas (see
+        trajectory.py), continuing an earlier file from offset bytes in if
+        given. JSON is compressed as it is written, by the meta's
+        'sarc_compression' ('gzip' or 'xz') at its 'compression_level'. If
+        the meta's 'sarc_writer' is 'background', JSON is encoded and
+        written on a background_writer thread, up to 'sarc_queue' timesteps
+        behind the run."""
         self.sarc = sarc
         self.meta = meta
         self.working_directory = working_dir
-        sarc_name = '/'+meta['name']+'.sarc.json'
-        self.working_filename = self.working_directory + sarc_name
-        self.working_file = open(self.working_filename, 'a')
-        self.next_write = '[\n'
-        self.append(True)
+        self.working_filename = self.working_name(meta, working_dir)
+        self.policy = metrics.record_policy.from_dict(meta.get('sarc_policy'))
+        self.trajectory = meta.get('sarc_format') == 'trajectory'
+        self.background = None
+        if self.trajectory:
+            self.writer = trajectory.TrajectoryWriter(
+                self.working_filename, sarc, meta.get('keyframe_every'),
+                offset)
+            if offset is None:
+                self.append(True)
+            return
+        if meta.get('sarc_writer') == 'background':
+            # A copy of the sarc to load each timestep's snapshot into, as
+            # made without disturbing the run's random draws
+            random_state = np.random.get_state()
+            self._shadow = hs.hs()
+            self._shadow.from_dict(sarc.to_dict())
+            np.random.set_state(random_state)
+            self.background = background_writer(self._write_capture,
+                                                meta.get('sarc_queue'))
+        self.compressor = SARC_COMPRESSORS[
+            meta.get('sarc_compression', 'gzip')][1]
+        self.compression_level = meta.get('compression_level',
+                                          COMPRESSION_LEVEL)
+        if offset is None:
+            self.raw_file = open(self.working_filename, 'wb')
+            self.next_write = '[\n'
+        else:
+            # Drop anything written after the offset was recorded
+            self.raw_file = open(self.working_filename, 'r+b')
+            self.raw_file.truncate(offset)
+            self.raw_file.seek(offset)
+            self.next_write = ',\n'
+        self.working_file = self.compressor(self.raw_file,
+                                            self.compression_level)
+        if offset is None:
+            self.append(True)
+
+    @staticmethod
+    def working_name(meta, working_dir):
+        """Where the sarc file for a meta is written as the run goes"""
+        if meta.get('sarc_format') == 'trajectory':
+            return working_dir + '/' + meta['name'] + '.sarc.traj'
+        suffix = SARC_COMPRESSORS[meta.get('sarc_compression', 'gzip')][0]
+        return working_dir + '/' + meta['name'] + '.sarc.json' + suffix
 
     def append(self, first=False):
-        """Add the current timestep sarcomere to the sarc file"""
-        if not first:
-            self.next_write +=',\n'
-        self.next_write += json.dumps(self.sarc.to_dict(), sort_keys=True)
-        self.working_file.write(self.next_write)
-        self.next_write = ''
+        """Add the current timestep sarcomere to the sarc file, if the sarc
+        policy chooses it, as it does the first"""
+        if not first and not self.policy.due(self.sarc):
+            return
+        if self.trajectory:
+            self.writer.append()
+        elif self.background is not None:
+            # Only a cheap copy of the state is taken on the run's thread
+            records = dict([(name, getattr(self.sarc, name))
+                            for name in SARC_RECORDS
+                            if hasattr(self.sarc, name)])
+            self.background.put((self.sarc.to_snapshot(), records))
+        else:
+            self._write_dict(self.sarc.to_dict())
+
+    def _write_dict(self, sarc_dict):
+        """Write a sarcomere dict to the JSON sarc file"""
+        self.working_file.write((self.next_write + json.dumps(
+            sarc_dict, sort_keys=True)).encode())
+        self.next_write = ',\n'
+
+    def _write_capture(self, capture):
+        """Write a sarcomere dict from a snapshot and the records of
+        SARC_RECORDS, on the background writer's thread"""
+        snapshot, records = capture
+        self._shadow.from_snapshot(snapshot)
+        self._shadow.__dict__.update(records)
+        self._write_dict(self._shadow.to_dict())
+
+    def offset(self):
+        """Bytes of the sarc file written so far, flushed to disk"""
+        if self.trajectory:
+            return self.writer.offset()
+        if self.background is not None:
+            self.background.wait()
+        # End the compressed stream here and start another after it, the
+        # streams of a file read back as one, so it can be resumed here
+        self.working_file.close()
+        self.raw_file.flush()
+        offset = self.raw_file.tell()
+        self.working_file = self.compressor(self.raw_file,
+                                            self.compression_level)
+        return offset
+
+    def close(self):
+        """Close the sarc file part way, to be carried on from offset()"""
+        if self.trajectory:
+            self.writer.file.close()
+            return
+        if self.background is not None:
+            self.background.close()
+        self.working_file.close()
+        self.raw_file.close()
+
+    @classmethod
+    def branch(cls, prefix_meta, prefix_dir, offset, meta, working_dir,
+               prefix_time_dependence, time_dependence):
+        """Start a run's sarc file with the first offset bytes of a closed
+        prefix run's, recording the run's time dependence in place of the
+        prefix's, and return the offset to carry on from"""
+        prefix_filename = cls.working_name(prefix_meta, prefix_dir)
+        filename = cls.working_name(meta, working_dir)
+        if meta.get('sarc_format') == 'trajectory':
+            # Only the header records the time dependence
+            with open(prefix_filename, 'rb') as prefix_file, \
+                 open(filename, 'wb') as branch_file:
+                header = trajectory.read_header(prefix_file)
+                header['time_dependence'] = time_dependence
+                trajectory.write_header(branch_file, header)
+                records = offset - prefix_file.tell()
+                branch_file.write(prefix_file.read(records))
+                return branch_file.tell()
+        # Each frame records the time dependence, swap it frame by frame
+        swap = lambda td: b'"time_dependence":' + json.dumps(
+            td, sort_keys=True).encode()
+        prefix_td, td = swap(prefix_time_dependence), swap(time_dependence)
+        compressor = SARC_COMPRESSORS[meta.get('sarc_compression', 'gzip')][1]
+        with archive.open_sarc_json(prefix_filename) as prefix_file, \
+             open(filename, 'wb') as raw_file:
+            branch_file = compressor(
+                raw_file, meta.get('compression_level', COMPRESSION_LEVEL))
+            for line in prefix_file:
+                if line.startswith(b'{') and prefix_td not in line:
+                    raise ValueError("Time dependence not found in a frame "
+                                     "of " + prefix_filename)
+                branch_file.write(line.replace(prefix_td, td, 1))
+            branch_file.close()
+            return raw_file.tell()
 
     def finalize(self):
-        """Close the current sarcomere file for proper JSON formatting"""
-        self.working_file.write('\n]')
+        """Close the current sarcomere file for proper JSON formatting, or
+        index it if a trajectory, which is left uncompressed"""
+        if self.trajectory:
+            self.writer.close()
+            self.zip_filename = self.working_filename
+            return self.zip_filename
+        if self.background is not None:
+            self.background.close()
+        self.working_file.write(b'\n]')
         self.working_file.close()
-        time.sleep(1)
-        self.zip_filename = self.meta['name']+'.sarc.tar.gz'
-        cp = subprocess.run(['tar', 'czf', self.zip_filename,
-                             '-C', self.working_directory,
-                             self.working_filename])
-        os.remove(self.working_filename)
+        self.raw_file.close()
+        self.zip_filename = self.working_filename
         return self.zip_filename
 
     def delete(self):
@@ -216,88 +626,98 @@ class sarc_file:
 
 
 class data_file:
-    def __init__(self, sarc, meta, working_dir):
-        """Generate the dictionary for use with the below data callback"""
+    def __init__(self, sarc, meta, working_dir, checkpoint=None):
+        """Generate the dictionary for use with the below data callback or,
+        if the meta's 'data_format' is 'columns', a column file (see
+        columns.py) to write each timestep's values into in place. Which
+        values are recorded, and how often, is set by the meta, see
+        metrics.recorder.from_meta. Carries on from the checkpoint() of an
+        earlier data_file if given."""
         self.sarc = sarc
         self.meta = meta
         self.working_directory = working_dir
-        self.data_dict = {
-            'name': self.meta['name'],
-            'timestep_length': self.sarc.timestep_len,
-            'timestep': [],
-            'z_line': [],
-            'lattice_spacing': [],
-            'axial_force': [],
-            'radial_force_y': [],
-            'radial_force_z': [],
-            'radial_tension': [],
-            'xb_fraction_free': [],
-            'xb_fraction_loose': [],
-            'xb_fraction_tight': [],
-            'xb_trans_12': [],
-            'xb_trans_23': [],
-            'xb_trans_31': [],
-            'xb_trans_21': [],
-            'xb_trans_32': [],
-            'xb_trans_13': [],
-            'xb_trans_static': [],
-            'actin_permissiveness': [],
-            'thick_displace_mean': [],
-            'thick_displace_max': [],
-            'thick_displace_min': [],
-            'thick_displace_std': [],
-            'thin_displace_mean': [],
-            'thin_displace_max': [],
-            'thin_displace_min': [],
-            'thin_displace_std': [],
-        }
+        self.recorder = metrics.recorder.from_meta(self.sarc, self.meta)
+        self.columnar = self.meta.get('data_format') == 'columns'
+        if self.columnar:
+            self.working_filename = self.columns_name(self.meta,
+                                                      self.working_directory)
+            if checkpoint is None:
+                self.column_file = columns.column_file(
+                    self.working_filename, self.recorder.columns,
+                    self.recorder.rows(self.meta['timestep_number']),
+                    {'timestep_length': float(self.sarc.timestep_len)})
+            else:
+                self.column_file = columns.column_file(
+                    self.working_filename, rows=checkpoint)
+        elif checkpoint is not None:
+            self.data_dict = checkpoint
+        else:
+            self.data_dict = {
+                'name': self.meta['name'],
+                'timestep_length': self.sarc.timestep_len,
+            }
+            for name, dtype in self.recorder.columns:
+                self.data_dict[name] = []
+
+    @staticmethod
+    def columns_name(meta, working_dir):
+        """Where the column file for a meta is written as the run goes"""
+        return working_dir + '/' + meta['name'] + '.data.cols'
+
+    def checkpoint(self):
+        """What a later data_file needs to carry on from this one"""
+        if self.columnar:
+            self.column_file.flush()
+            return self.column_file.rows
+        return self.data_dict
 
     def append(self):
-        """Digest out the non-vector values we want to record for each
-        timestep and append them to the data_dict. This is called at each
-        timestep to build a dict for inclusion in a pandas dataframe.
+        """Record the metrics of the current timestep, if it is one to be
+        recorded, appending them to the data_dict or the column file. This
+        is called at each timestep to build a dict for inclusion in a pandas
+        dataframe.
         """
-        ## Lambda helpers
-        ad = lambda n,v: self.data_dict[n].append(v)
-        ## Calculated components
-        radial_force = self.sarc.radialforce()
-        xb_fracs = self.sarc.get_frac_in_states()
-        xb_trans = sum(sum(self.sarc.last_transitions,[]),[])
-        act_perm = np.mean(self.sarc.actin_permissiveness)
-        thick_d = np.hstack([t.displacement_per_crown()
-                             for t in self.sarc.thick])
-        thin_d = np.hstack([t.displacement_per_node()
-                            for t in self.sarc.thin])
-        ## Dictionary work
-        ad('timestep', self.sarc.current_timestep)
-        ad('z_line', self.sarc.z_line)
-        ad('lattice_spacing', self.sarc.lattice_spacing)
-        ad('axial_force', self.sarc.axialforce())
-        ad('radial_force_y', radial_force[0])
-        ad('radial_force_z', radial_force[1])
-        ad('radial_tension', self.sarc.radialtension())
-        ad('xb_fraction_free', xb_fracs[0])
-        ad('xb_fraction_loose', xb_fracs[1])
-        ad('xb_fraction_tight', xb_fracs[2])
-        ad('xb_trans_12', xb_trans.count('12'))
-        ad('xb_trans_23', xb_trans.count('23'))
-        ad('xb_trans_31', xb_trans.count('31'))
-        ad('xb_trans_21', xb_trans.count('21'))
-        ad('xb_trans_32', xb_trans.count('32'))
-        ad('xb_trans_13', xb_trans.count('13'))
-        ad('xb_trans_static', xb_trans.count(None))
-        ad('actin_permissiveness', act_perm)
-        ad('thick_displace_mean', np.mean(thick_d))
-        ad('thick_displace_max', np.max(thick_d))
-        ad('thick_displace_min', np.min(thick_d))
-        ad('thick_displace_std', np.std(thick_d))
-        ad('thin_displace_mean', np.mean(thin_d))
-        ad('thin_displace_max', np.max(thin_d))
-        ad('thin_displace_min', np.min(thin_d))
-        ad('thin_displace_std', np.std(thin_d))
+        if not self.recorder.due():
+            return
+        row = self.recorder.record()
+        if self.columnar:
+            self.column_file.append(row)
+        else:
+            for name, value in row.items():
+                self.data_dict[name].append(value)
+
+    def close(self):
+        """Close the column file part way, to be carried on from
+        checkpoint(); a data dict is carried on in the checkpoint"""
+        if self.columnar:
+            self.column_file.close()
+
+    @classmethod
+    def branch(cls, prefix_meta, prefix_dir, checkpoint, sarc, meta,
+               working_dir):
+        """Start a run's data file with the rows of a closed prefix run's,
+        as of the prefix's checkpoint(), and return the checkpoint() to
+        carry on from"""
+        if meta.get('data_format') != 'columns':
+            data_dict = dict(checkpoint)
+            data_dict['name'] = meta['name']
+            return data_dict
+        # Copy the rows into a column file sized for this run
+        prefix = columns.read_columns(
+            cls.columns_name(prefix_meta, prefix_dir))
+        datafile = cls(sarc, meta, working_dir)
+        for name, column in datafile.column_file.columns.items():
+            column[:checkpoint] = prefix[name][:checkpoint]
+        datafile.column_file.rows = checkpoint
+        datafile.close()
+        return checkpoint
 
     def finalize(self):
-        """Write the data dict to the temporary file location"""
+        """Write the data dict to the temporary file location, or flush and
+        close the column file"""
+        if self.columnar:
+            self.column_file.close()
+            return self.working_filename
         data_name = '/'+self.meta['name']+'.data.json'
         self.working_filename = self.working_directory + data_name
         with open(self.working_filename, 'w') as datafile:
@@ -314,8 +734,9 @@ class data_file:
 
 class s3:
     def __init__(self):
-        """Provide an interface to to S3 that hides some error handling"""
-        self._refresh_s3_connection()
+        """Provide an interface to to S3 that hides some error handling,
+        connecting on first use so that local runs need no credentials"""
+        self.s3 = None
 
     def _refresh_s3_connection(self):
         """Reconnect to s3, the connection gets dropped sometimes"""
@@ -323,6 +744,8 @@ class s3:
 
     def _get_bucket(self, bucket_name):
         """Return link to a bucket name"""
+        if self.s3 is None:
+            self._refresh_s3_connection()
         try:
             bucket = self.s3.get_bucket(bucket_name)
         except (boto.exception.BotoClientError,
@@ -333,6 +756,22 @@ class s3:
             bucket = self.s3.get_bucket(bucket_name)
         return bucket
 
+    def _parse_key(self, name):
+        """Split bucket/keyname into the bucket and the key's name"""
+        bucket_name = [n for n in name.split('/') if len(n)>3][0] # rm s3:// & /
+        key_name = name[len(bucket_name)+name.index(bucket_name):]
+        return self._get_bucket(bucket_name), key_name
+
+    def exists_on_s3(self, name):
+        """Whether the key bucket/keyname exists on S3"""
+        bucket, key_name = self._parse_key(name)
+        return bucket.get_key(key_name) is not None
+
+    def delete_from_s3(self, name):
+        """Delete the key bucket/keyname from S3, if it is there"""
+        bucket, key_name = self._parse_key(name)
+        bucket.delete_key(key_name)
+
     def pull_from_s3(self, name, local='./'):
         """Given a key on S3, download it to a local file
 
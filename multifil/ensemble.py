@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+ensemble.py - Replicate half-sarcomeres run in lockstep
+
+Stochastic runs are usually repeated many times over to average out the noise
+of cross-bridge cycling. An Ensemble holds a set of replicate half-sarcomeres
+built with the same options and the same filament starts, so that they share
+one lattice topology, and advances them together. Their stores are combined
+into one (see store.LatticeStore.combine), so each timestep's transitions and
+settle are carried out once across every replicate rather than once for each.
+
+The combined store lays the replicates end to end along its existing axes,
+the first replicate's cross-bridges, sites, and filaments followed by the
+second's and so on. The Ensemble's state properties view these arrays with
+a leading replicate dimension instead, and its force and state methods give
+one result per replicate.
+
+The replicates remain complete hs.hs instances, viewing their share of the
+combined state, so anything written to work on a half-sarcomere, such as the
+callbacks passed to hs.run, can be used on each in turn.
+"""
+
+import sys
+import time
+import multiprocessing as mp
+import numpy as np
+from . import hs
+from . import store
+from . import settle
+
+
+class Ensemble:
+    """Replicates of one half-sarcomere, advanced together"""
+    def __init__(self, replicates=2, **kwargs):
+        """Create the replicates and combine their state
+
+        Parameters:
+            replicates: number of replicate half-sarcomeres (2)
+            **kwargs: passed on to hs.hs to create each replicate. The
+                replicates share the first's filament starts unless starts
+                are passed, and kinetics are always "batch".
+        Returns:
+            None
+
+        The ensemble settles all of its replicates together, until the
+        largest residual force across them is below the convergence limit.
+        The "newton" settle method scales best with the number of
+        replicates, as "direct" factors a system the size of the total
+        number of bound cross-bridges.
+        """
+        kwargs['kinetics'] = "batch"
+        first = hs.hs(**kwargs)
+        if kwargs.get('starts') is None:
+            kwargs['starts'] = (first._thin_starts, first._thick_starts)
+        self.replicates = [first] + [hs.hs(**kwargs)
+                                     for i in range(replicates - 1)]
+        # Work on the replicates' state as that of one large lattice
+        self.store = store.LatticeStore.combine(
+            [rep.store for rep in self.replicates])
+        self.thick = [thick for rep in self.replicates for thick in rep.thick]
+        self.thin = [thin for rep in self.replicates for thin in rep.thin]
+        self._n_xb = len(first.store.xbs)
+        self._heads = first._heads
+        self.timestep_len = first.timestep_len
+        self.settle_method = first.settle_method
+        if self.settle_method == "direct":
+            self._settler = settle.DirectSettle(self.thick, self.thin)
+        elif self.settle_method == "newton":
+            self._settler = settle.NewtonSettle(self.thick, self.thin)
+        self.bind_rejection_rate = None
+        self.last_settle = None
+
+    # The transitions and settle of a half-sarcomere, worked on the combined
+    # store and filaments as those of one large lattice
+    _transition_heads = hs.hs._transition_heads
+    _bound_xb_forces = hs.hs._bound_xb_forces
+    _thick_axial_forces = hs.hs._thick_axial_forces
+    _thin_axial_forces = hs.hs._thin_axial_forces
+    _single_settle = hs.hs._single_settle
+    _network_settle = hs.hs._network_settle
+    settle = hs.hs.settle
+
+    def to_dict(self):
+        """Create a JSON compatible representation of each replicate"""
+        return [rep.to_dict() for rep in self.replicates]
+
+    @property
+    def current_timestep(self):
+        """Return the current timestep"""
+        return self.replicates[0].current_timestep
+
+    @current_timestep.setter
+    def current_timestep(self, new_timestep):
+        """Set the current timestep of every replicate"""
+        for rep in self.replicates:
+            rep.current_timestep = new_timestep
+
+    @property
+    def lattice_spacing(self):
+        """The lattice spacing, shared by every replicate"""
+        return self.replicates[0].lattice_spacing
+
+    @property
+    def z_line(self):
+        """The z-line location, shared by every replicate"""
+        return self.replicates[0].z_line
+
+    @property
+    def xb_state(self):
+        """Numeric state of each cross-bridge, by (replicate, cross-bridge
+        id), a view of the combined store"""
+        return self.store.xb_state.reshape(len(self.replicates), -1)
+
+    @property
+    def permissiveness(self):
+        """Permissiveness of each binding site, by (replicate, site id), a
+        view of the combined store"""
+        return self.store.permissiveness.reshape(len(self.replicates), -1)
+
+    @property
+    def thick_axial(self):
+        """Axial locations of the thick filament crowns, by (replicate,
+        thick filament index, crown index), a view of the combined store"""
+        return self.store.thick_axial.reshape(
+            (len(self.replicates), -1) + self.store.thick_axial.shape[1:])
+
+    @property
+    def thin_axial(self):
+        """Axial locations of the thin filament nodes, by (replicate, thin
+        filament index, node index), a view of the combined store"""
+        return self.store.thin_axial.reshape(
+            (len(self.replicates), -1) + self.store.thin_axial.shape[1:])
+
+    def axialforce(self):
+        """Each replicate's axial force on the M-line, as hs.axialforce"""
+        return np.array([rep.axialforce() for rep in self.replicates])
+
+    def radialtension(self, forces=None):
+        """Each replicate's radial tension, as hs.radialtension, from the
+        cross-bridge forces of _bound_xb_forces if already found"""
+        if forces is None:
+            forces = self._bound_xb_forces()
+        bound, _, radial = forces
+        return np.bincount(bound // self._n_xb, radial,
+                           len(self.replicates))
+
+    def radialforce(self, forces=None):
+        """Each replicate's radial force, as hs.radialforce, by (replicate,
+        (y,z)), from the cross-bridge forces of _bound_xb_forces if already
+        found"""
+        if forces is None:
+            forces = self._bound_xb_forces()
+        bound, _, radial = forces
+        rep = bound // self._n_xb
+        vectors = radial[:, None] * self.store.xb_orient[bound]
+        return np.stack([np.bincount(rep, vectors[:, i], len(self.replicates))
+                         for i in range(2)], axis=1)
+
+    def get_frac_in_states(self):
+        """Each replicate's fraction of cross-bridges in each state, by
+        (replicate, state)"""
+        return np.stack([np.bincount(states, minlength=3) / float(len(states))
+                         for states in self.xb_state])
+
+    def run(self, time_steps=100, callback=None, bar=True):
+        """Run the replicates for the specified number of timesteps
+
+        Parameters:
+            time_steps: number of time steps to run the model for (100)
+            callback: function to be executed after each time step to
+                collect data, called with each replicate in turn as in
+                hs.run. (Defaults to the axial force at the M-line if not
+                specified.)
+            bar: progress bar control, as in hs.run (Defaults to True)
+        Returns:
+            output: for each replicate, the results of the callback after
+                each timestep
+        """
+        # Callback defaults to the axial force at the M-line
+        if callback is None:
+            callback = lambda sarc: sarc.axialforce()
+        # Create a place to store callback information and note the time
+        output = [[] for rep in self.replicates]
+        tic = time.time()
+        # Run through each timestep
+        for i in range(time_steps):
+            self.timestep()
+            for out, rep in zip(output, self.replicates):
+                out.append(callback(rep))
+            # Update us on how it went
+            toc = int((time.time()-tic) / (i+1) * (time_steps-i-1))
+            proc_name = mp.current_process().name
+            if bar == True:
+                sys.stdout.write("\n" + proc_name +
+                    " finished timestep %i of %i, %ih%im%is left"\
+                    %(i+1, time_steps, toc/60/60, toc/60%60, toc%60))
+                sys.stdout.flush()
+            elif type(bar) == type(lambda x:x):
+                bar(i, time_steps, toc, time.time()-tic, proc_name)
+        return output
+
+    def timestep(self, current=None):
+        """Move every replicate one step forward in time, allowing the
+        myosin heads a chance to bind and then balancing forces
+        """
+        # Record our passage through time
+        if current is not None:
+            self.current_timestep = current
+        else:
+            self.current_timestep = self.current_timestep + 1
+        # Update bound states, each replicate behind its own hiding line
+        n_xb = self._n_xb
+        hiding_line = np.repeat([rep.hiding_line for rep in self.replicates],
+                                n_xb)
+        trans = self._transition_heads(hiding_line)
+        self.store.sync_links()
+        # Settle forces
+        self.settle()
+        # Pass the step's records on to each replicate
+        for i, rep in enumerate(self.replicates):
+            rep.last_transitions = rep._group_transitions(
+                trans[i * n_xb:(i + 1) * n_xb])
+            rep.bind_rejection_rate = self.bind_rejection_rate
+            rep.last_settle = self.last_settle
+
+
+if __name__ == '__main__':
+    print("ensemble.py is really meant to be called as a supporting module")
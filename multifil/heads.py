@@ -0,0 +1,724 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+heads.py - Many myosin heads at once
+
+mh.Head works through the mechanics and kinetics of one myosin head at a
+time. Heads carries the same math over numpy arrays so that every
+cross-bridge in the lattice can be given its chance to transition in a single
+pass. The spring constants and free energy helpers are read off of an
+mh.Head instance, so the two stay in agreement, and mh.Head remains the
+reference that Heads is checked against.
+
+States are numeric, as in mh.Head.numeric_state: 0 for free, 1 for loosely
+bound, and 2 for tightly bound. Transitions are reported as integers, 12 for
+the free to loose transition and so on, with 0 meaning no transition.
+"""
+
+import copy
+import numpy as np
+import numpy.random as random
+from . import mh
+
+# Integer transition codes and their string equivalents from mh.Head
+NO_TRANSITION = 0
+TRANSITIONS = {12: '12', 21: '21', 23: '23', 32: '32', 31: '31'}
+
+
+class TipSampler:
+    """Draw diffused head tip locations for many heads at once
+
+    An unbound head's converter angle and globular length are normally
+    distributed about their rest values. Only tips that land short of the
+    thin filament are valid, so each head's draw is a normal truncated by the
+    lattice spacing. As in mh.Head._bind this is done by rejection, but all
+    heads are drawn for at once and each pending head is given several
+    candidates per round, the number chosen from the acceptance rate seen so
+    far, so that few rounds are needed. A head takes its first valid
+    candidate, which keeps the result identical in distribution to redrawing
+    one candidate at a time.
+
+    The sampler counts the candidates that one-at-a-time redrawing would
+    have needed, and how many of those were rejected, so the cost of
+    binding at a given lattice spacing can be followed through a run.
+    """
+    def __init__(self, c_bop, g_bop):
+        """Create the sampler
+
+        Parameters:
+            c_bop: (rest, standard deviation) of the converter angle
+            g_bop: (rest, standard deviation) of the globular length
+        """
+        self.c_bop = c_bop
+        self.g_bop = g_bop
+        self._acceptance = 0.5 # running estimate, sizes each round
+        self.reset()
+
+    def reset(self):
+        """Zero the candidate counts"""
+        self.proposed = 0
+        self.rejected = 0
+
+    @property
+    def rejection_rate(self):
+        """Fraction of candidate tips rejected since the last reset"""
+        if self.proposed == 0:
+            return None
+        return self.rejected / float(self.proposed)
+
+    def sample(self, y):
+        """Draw a valid tip location for each head
+
+        Takes:
+            y: lattice spacing seen by each head, an array
+        Returns:
+            (tip_x, tip_y): axial and radial location of each head's tip
+        """
+        shape = np.shape(y)
+        y = np.asarray(y, dtype=float).ravel()
+        tip_x = np.empty(y.size)
+        tip_y = np.empty(y.size)
+        todo = np.arange(y.size)
+        while todo.size > 0:
+            # Candidates per pending head, enough to all but finish
+            per = int(min(64, max(1, np.ceil(2.0 / self._acceptance))))
+            size = (todo.size, per)
+            c_ang = random.normal(self.c_bop[0], self.c_bop[1], size)
+            g_len = random.normal(self.g_bop[0], self.g_bop[1], size)
+            cand_y = g_len * np.sin(c_ang)
+            valid = cand_y <= y[todo, None]
+            # Each head takes its first valid candidate, if any
+            found = valid.any(1)
+            first = valid.argmax(1)
+            rows = np.flatnonzero(found)
+            cols = first[rows]
+            tip_x[todo[rows]] = g_len[rows, cols] * np.cos(c_ang[rows, cols])
+            tip_y[todo[rows]] = cand_y[rows, cols]
+            # Tally what drawing one candidate at a time would have cost
+            used = np.where(found, first + 1, per)
+            self.proposed += int(used.sum())
+            self.rejected += int(used.sum()) - rows.size
+            self._acceptance = np.clip(valid.mean(), 0.02, 1.0)
+            todo = todo[~found]
+        return tip_x.reshape(shape), tip_y.reshape(shape)
+
+
+class Heads:
+    """Vectorized counterpart to mh.Head, for arrays of heads"""
+    def __init__(self, head=None):
+        """Pull the spring and energy values we need from a reference head
+
+        Parameters:
+            head: an mh.Head (or Crossbridge) to take constants from, a new
+                mh.Head is used if none is passed
+        """
+        if head is None:
+            head = mh.Head()
+        # Rest values and spring constants, indexed by numeric state
+        c, g = head.c, head.g
+        self.c_rest = np.array([c.r_w, c.r_w, c.r_s])
+        self.c_k = np.array([c.k_w, c.k_w, c.k_s])
+        self.g_rest = np.array([g.r_w, g.r_w, g.r_s])
+        self.g_k = np.array([g.k_w, g.k_w, g.k_s])
+        # Diffusion of the unbound springs
+        self.tips = TipSampler((c.r_w, c.stand_dev), (g.r_w, g.stand_dev))
+        # Free energy helpers
+        self.alphaDG = head.alphaDG
+        self.etaDG = head.etaDG
+        # Rates are calculated directly unless a RateTable is attached
+        self.table = None
+        # Binding diffuses each tip unless an ExpectedBinding is attached
+        self.expected = None
+
+    @staticmethod
+    def seg_values(x, y):
+        """Return the angle and length to each head tip
+
+        Takes:
+            x: axial distances from crown to actin
+            y: radial distances from crown to actin, the lattice spacing
+        Returns:
+            (c_ang, g_len): the angle and length of the heads' springs
+        """
+        return np.arctan2(y, x), np.hypot(y, x)
+
+    def energy(self, x, y, state):
+        """Return the energy stored in each head
+
+        Takes:
+            x: axial distances from crown to actin
+            y: lattice spacing, a scalar or an array matching x
+            state: numeric state to evaluate the heads in, scalar or array
+        Returns:
+            xb_energy: the energy stored in each head
+        """
+        c_ang, g_len = self.seg_values(x, y)
+        c_energy = 0.5 * self.c_k[state] * (c_ang - self.c_rest[state])**2
+        g_energy = 0.5 * self.g_k[state] * (g_len - self.g_rest[state])**2
+        return c_energy + g_energy
+
+    def axialforce(self, x, y, state):
+        """Axial force each head generates, see mh.Head.axialforce
+
+        Takes:
+            x: axial distances from crown to actin
+            y: lattice spacing, a scalar or an array matching x
+            state: numeric state of each head, scalar or array
+        Returns:
+            f_x: the axial force generated by each head
+        """
+        c_ang, g_len = self.seg_values(x, y)
+        c_term = self.c_k[state] * (c_ang - self.c_rest[state])
+        g_term = self.g_k[state] * (g_len - self.g_rest[state])
+        return g_term * np.cos(c_ang) + c_term * np.sin(c_ang) / g_len
+
+    def radialforce(self, x, y, state):
+        """Radial force each head generates, see mh.Head.radialforce
+
+        Takes:
+            x: axial distances from crown to actin
+            y: lattice spacing, a scalar or an array matching x
+            state: numeric state of each head, scalar or array
+        Returns:
+            f_y: the radial force generated by each head
+        """
+        c_ang, g_len = self.seg_values(x, y)
+        c_term = self.c_k[state] * (c_ang - self.c_rest[state])
+        g_term = self.g_k[state] * (g_len - self.g_rest[state])
+        return g_term * np.sin(c_ang) + c_term * np.cos(c_ang) / g_len
+
+    def axial_stiffness(self, x, y, state):
+        """Derivative of each head's axial force with respect to the axial
+        distance from crown to actin, at a fixed lattice spacing
+
+        Takes:
+            x: axial distances from crown to actin
+            y: lattice spacing, a scalar or an array matching x
+            state: numeric state of each head, scalar or array
+        Returns:
+            df_x/dx: the axial stiffness of each head
+        """
+        c_ang, g_len = self.seg_values(x, y)
+        cos, sin = np.cos(c_ang), np.sin(c_ang)
+        c_term = self.c_k[state] * (c_ang - self.c_rest[state])
+        g_term = self.g_k[state] * (g_len - self.g_rest[state])
+        # Using dg/dx = cos(c) and dc/dx = -sin(c)/g
+        return (self.g_k[state] * cos**2 + g_term * sin**2 / g_len -
+                (self.c_k[state] * sin**2 + 2 * c_term * sin * cos) /
+                g_len**2)
+
+    def free_energy(self, x, y, state):
+        """Free energy of each head in a single numeric state
+
+        Takes:
+            x: axial distances from crown to actin
+            y: lattice spacing, a scalar or an array matching x
+            state: numeric state, 0, 1, or 2
+        Returns:
+            energy: free energy of each head in that state
+        """
+        if state == 0:
+            return np.zeros(np.shape(x))
+        elif state == 1:
+            return self.alphaDG + self.energy(x, y, 1)
+        elif state == 2:
+            return self.etaDG + self.energy(x, y, 2)
+
+    @staticmethod
+    def prob(rate, timestep):
+        """Convert per ms rates to probabilities over a timestep, see
+        mh.Head._prob for the reasoning
+        """
+        return 1 - np.exp(-rate * timestep)
+
+    def bind(self, x, y):
+        """Binding rate for each head, from a diffused tip location
+
+        Each head's tip is diffused to a new location short of the thin
+        filament, as in mh.Head._bind, see TipSampler.
+
+        Takes:
+            x: axial distances from crown to actin
+            y: lattice spacing, a scalar or an array matching x
+        Returns:
+            rate: per ms binding rate of each head
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.broadcast_to(y, x.shape)
+        tip_x, tip_y = self.tips.sample(y)
+        distance = np.hypot(x - tip_x, y - tip_y)
+        return 72 * np.exp(-distance**2)
+
+    def _by_spacing(self, find, x, y, *args):
+        """Call find(x, y, *args) for each lattice spacing in y in turn"""
+        if np.ndim(y) == 0:
+            return find(x, y, *args)
+        found = np.empty(x.shape)
+        for value in np.unique(y):
+            here = y == value
+            found[here] = find(x[here], value, *[a[here] for a in args])
+        return found
+
+    def _check_expected(self, timestep):
+        """Make sure the ExpectedBinding is for this length of timestep"""
+        if timestep != self.expected.timestep:
+            raise ValueError("Expected binding is tabulated for a %g ms "
+                             "timestep, not %g ms" % (self.expected.timestep,
+                                                      timestep))
+
+    def bind_prob(self, x, y, timestep):
+        """Chance of each free head binding over a timestep
+
+        If an ExpectedBinding is attached this is the chance averaged over
+        the diffusion of the tip, otherwise that at a diffused tip location.
+
+        Takes:
+            x: axial distances from crown to actin
+            y: lattice spacing, a scalar or an array matching x
+            timestep: length of the timestep in ms
+        Returns:
+            prob: chance of each head binding, before actin permissiveness
+        """
+        x = np.asarray(x, dtype=float)
+        if self.expected is None:
+            return self.prob(self.bind(x, y), timestep)
+        self._check_expected(timestep)
+        return self._by_spacing(
+            lambda x, y: self.expected.lookup('bind', x, y), x, y)
+
+    @staticmethod
+    def _ratio(rate, exponent):
+        """rate/exp(exponent), with a rate of 1 where exp underflows"""
+        with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+            denominator = np.exp(exponent)
+            ratio = rate / denominator
+        return np.where(denominator == 0, 1.0, ratio)
+
+    def _tabulated(self, y):
+        """Whether rates at lattice spacing y can be read from the table"""
+        return self.table is not None and np.ndim(y) == 0
+
+    def r21(self, x, y):
+        """Per ms rate of unbinding if loosely bound, see mh.Head._r21"""
+        if self._tabulated(y):
+            loose = self.table.lookup('loose', x, y)
+        else:
+            loose = self.free_energy(x, y, 1)
+        return self._ratio(self.bind(x, y), -loose)
+
+    def r21_prob(self, x, y, timestep):
+        """Chance of each loosely bound head unbinding over a timestep,
+        averaged over the diffusion of the tip if an ExpectedBinding is
+        attached, see bind_prob"""
+        x = np.asarray(x, dtype=float)
+        if self.expected is None:
+            return self.prob(self.r21(x, y), timestep)
+        self._check_expected(timestep)
+        if self._tabulated(y):
+            loose = self.table.lookup('loose', x, y)
+        else:
+            loose = self.free_energy(x, y, 1)
+        return self._by_spacing(self.expected.unbind, x, y, loose)
+
+    def r23(self, x, y):
+        """Per ms rate of becoming tightly bound if loosely bound"""
+        if self._tabulated(y):
+            return self.table.lookup('r23', x, y)
+        return self._r23(self.energy(x, y, 1), self.energy(x, y, 2))
+
+    @staticmethod
+    def _r23(loose_energy, tight_energy):
+        """r23 from the energy stored in the loose and tight states"""
+        return 0.6 * (1 + np.tanh(6 + 0.2 * (loose_energy - tight_energy)))
+
+    def r32(self, x, y):
+        """Per ms rate of becoming loosely bound if tightly bound"""
+        if self._tabulated(y):
+            loose, tight, r23 = self.table.lookup(('loose', 'tight', 'r23'),
+                                                  x, y)
+        else:
+            loose = self.free_energy(x, y, 1)
+            tight = self.free_energy(x, y, 2)
+            r23 = self.r23(x, y)
+        return self._ratio(r23, loose - tight)
+
+    def r31(self, x, y):
+        """Per ms rate of unbinding if tightly bound"""
+        if self._tabulated(y):
+            tight_energy = self.table.lookup('tight', x, y) - self.etaDG
+        else:
+            tight_energy = self.energy(x, y, 2)
+        return np.sqrt(0.01 * np.maximum(tight_energy, 0)) + 0.02
+
+    def transition(self, state, x, y, ap, timestep):
+        """Give every head a chance to transition
+
+        This follows the same decision tree as mh.Head.transition, with one
+        random check per head, but rates are only evaluated for the heads
+        that reach a given branch of the tree.
+
+        Takes:
+            state: numeric state of each head
+            x: axial distance from each crown to its bound or nearest actin
+            y: lattice spacing, a scalar or an array matching x
+            ap: actin permissiveness of each head's actin site
+            timestep: length of the timestep in ms
+        Returns:
+            (new_state, transition): the numeric state of each head after the
+                timestep and the integer code of the transition each
+                underwent (NO_TRANSITION if none)
+        """
+        state = np.asarray(state)
+        x = np.asarray(x, dtype=float)
+        ap = np.broadcast_to(ap, x.shape)
+        # A single lattice spacing is passed through as is, so that rates
+        # can be read from the table
+        y = np.asarray(y, dtype=float)
+        at = (lambda i: y) if y.ndim == 0 else (lambda i: y[i])
+        check = random.rand(state.size)
+        new_state = state.copy()
+        trans = np.zeros(state.shape, dtype=np.int8)
+        # Free heads may bind
+        i = np.flatnonzero(state == 0)
+        prob = self.bind_prob(x[i], at(i), timestep) * ap[i]
+        i = i[prob > check[i]]
+        new_state[i], trans[i] = 1, 12
+        # Loosely bound heads may power-stroke or unbind
+        i = np.flatnonzero(state == 1)
+        forward = self.prob(self.r23(x[i], at(i)), timestep) > check[i]
+        new_state[i[forward]], trans[i[forward]] = 2, 23
+        i = i[~forward]
+        prob = self.r21_prob(x[i], at(i), timestep)
+        i = i[(1 - prob) < check[i]]
+        new_state[i], trans[i] = 0, 21
+        # Tightly bound heads may unbind or reverse the power-stroke
+        i = np.flatnonzero(state == 2)
+        forward = self.prob(self.r31(x[i], at(i)), timestep) > check[i]
+        new_state[i[forward]], trans[i[forward]] = 0, 31
+        i = i[~forward]
+        prob = self.prob(self.r32(x[i], at(i)), timestep)
+        i = i[(1 - prob) < check[i]]
+        new_state[i], trans[i] = 1, 32
+        return new_state, trans
+
+
+class RateTable:
+    """Head energies and rates tabulated over axial separation and lattice
+    spacing
+
+    The loose and tight free energies and r23 are smooth functions of a
+    head's axial separation from its actin site and of the lattice spacing.
+    These are tabulated on a grid of axial separations and lattice spacings,
+    both evenly spaced, and looked up by bilinear interpolation. The
+    remaining rates are built from the looked up values, r32 and r31 from
+    the free energies and r21 from the free energy and a diffused binding
+    rate, so the trigonometry of Head._seg_values is not repeated at every
+    lookup.
+
+    Rows of the grid, each a lattice spacing, are tabulated as lookups first
+    need them and kept, so a run tabulates only the span of lattice
+    spacings it reaches, once, however the spacing moves within it. The
+    lookups of each timestep share one lattice spacing, so the two rows to
+    either side of it are blended once per lattice spacing and the result
+    kept for the lookups that follow.
+
+    Bilinear interpolation of f with grid steps h_x and h_y is off by at
+    most h_x**2/8 * max|f_xx| + h_y**2/8 * max|f_yy|. As each row is
+    tabulated the second derivatives are estimated from second differences,
+    along the row and between it and rows half a step to either side, and
+    the largest bound for each quantity over the rows tabulated so far is
+    kept in the error dict, in kT for the free energies and per ms for r23.
+    Separations off the end of the grid are calculated directly.
+    """
+    QUANTITIES = ('loose', 'tight', 'r23')
+
+    def __init__(self, heads, x_range=(-40.0, 40.0), step=0.05, y_step=0.05):
+        """Create a table, its rows tabulated as lookups need them
+
+        Parameters:
+            heads: the Heads whose energies and rates are tabulated
+            x_range: span of axial separations to tabulate in nm
+                (-40.0, 40.0)
+            step: spacing of the grid of axial separations in nm (0.05)
+            y_step: spacing of the grid of lattice spacings in nm (0.05)
+        """
+        self.heads = heads
+        n = int(round((x_range[1] - x_range[0]) / step))
+        self.x = x_range[0] + step * np.arange(n + 1)
+        self.step = step
+        self.y_step = y_step
+        self.rows = {} # by index on the grid of lattice spacings
+        self.y = None # lattice spacing the rows were last blended at
+        self.values = {}
+        self.error = {}
+        self.builds = 0
+
+    def _evaluate(self, x, y):
+        """Calculate each tabulated quantity directly"""
+        heads = self.heads
+        loose = heads.free_energy(x, y, 1)
+        tight = heads.free_energy(x, y, 2)
+        r23 = heads._r23(loose - heads.alphaDG, tight - heads.etaDG)
+        return {'loose': loose, 'tight': tight, 'r23': r23}
+
+    def _tabulate(self, y):
+        """Each quantity along the grid of axial separations at lattice
+        spacing y"""
+        return self._evaluate(self.x, y)
+
+    def build(self, y):
+        """Tabulate a row of the quantities at lattice spacing y
+
+        Returns:
+            row: dict of each quantity along the grid of axial separations
+        """
+        half = self.y_step / 2
+        row = self._tabulate(y)
+        below, above = self._tabulate(y - half), self._tabulate(y + half)
+        for name in self.QUANTITIES:
+            x_curvature = np.abs(np.diff(row[name], 2)).max() / self.step**2
+            y_curvature = np.abs(below[name] - 2 * row[name]
+                                 + above[name]).max() / half**2
+            error = (self.step**2 * x_curvature +
+                     self.y_step**2 * y_curvature) / 8
+            self.error[name] = max(self.error.get(name, 0.0), error)
+        self.builds += 1
+        return row
+
+    def _row(self, j):
+        """The row at the jth lattice spacing of the grid, tabulated if not
+        already"""
+        if j not in self.rows:
+            self.rows[j] = self.build(j * self.y_step)
+        return self.rows[j]
+
+    def _blend(self, y):
+        """Interpolate between the rows to either side of lattice spacing y,
+        keeping the result in values"""
+        where = y / self.y_step
+        j = int(np.floor(where))
+        frac = where - j
+        below, above = self._row(j), self._row(j + 1)
+        self.values = {name: below[name] + frac * (above[name] - below[name])
+                       for name in self.QUANTITIES}
+        self.y = float(y)
+
+    def lookup(self, name, x, y):
+        """Interpolate a tabulated quantity at each axial separation
+
+        Takes:
+            name: which quantity, one of QUANTITIES, or a tuple of them
+            x: array of axial distances from crown to actin
+            y: lattice spacing, a scalar
+        Returns:
+            values: the quantity at each axial separation, or a tuple of
+                quantities if a tuple of names was passed
+        """
+        if y != self.y:
+            self._blend(y)
+        names = (name,) if isinstance(name, str) else name
+        x = np.asarray(x, dtype=float)
+        # The grid is even, so the interval holding each x is found directly
+        last = len(self.x) - 1
+        where = (x - self.x[0]) * (1.0 / self.step)
+        i = where.astype(np.intp)
+        np.minimum(np.maximum(i, 0, out=i), last - 1, out=i)
+        frac = where - i
+        off = (where < 0) | (where > last)
+        if off.any():
+            direct = self._evaluate(x[off], y)
+        found = []
+        for n in names:
+            table = self.values[n]
+            values = table[i] + frac * (table[i + 1] - table[i])
+            if off.any():
+                values[off] = direct[n]
+            found.append(values)
+        return found[0] if isinstance(name, str) else tuple(found)
+
+    def copy(self, heads):
+        """A table of the same quantities for another Heads
+
+        The copy shares the grid, and anything else fixed when the table
+        was created, as well as the rows tabulated so far, none of which
+        are changed in place. It tabulates new rows on its own as its
+        lattice spacing moves, leaving this table be.
+        """
+        table = copy.copy(self)
+        table.heads = heads
+        table.rows = dict(self.rows)
+        table.error = dict(self.error)
+        return table
+
+class ExpectedBinding(RateTable):
+    """Binding and unbinding probabilities averaged over tip diffusion
+
+    mh.Head._bind finds the binding rate, 72*exp(-d**2), at a single
+    diffused tip location, and a head binds over the timestep with
+    probability 1-exp(-rate*timestep). Averaging the rate first and then
+    converting it overstates the chance of binding, as the conversion is
+    concave. Here the per timestep probability itself is averaged over the
+    converter angle and globular length distributions, truncated where the
+    tip would pass the thin filament, giving the expected probability of
+    binding as a function of axial separation at each lattice spacing, for
+    one timestep length. This is tabulated over axial separation and
+    lattice spacing and looked up in the manner of RateTable, so that each
+    lattice spacing a run reaches is averaged over once. The truncation
+    moves with lattice spacing a quadrature point at a time, so the error
+    kept for it is an estimate rather than a bound.
+
+    The average is by quadrature over a grid of angles and lengths spanning
+    five standard deviations either side of rest. The probability doesn't
+    separate into axial and radial parts, so the weights are spread onto a
+    grid of axial separations and of radial distances short of the thin
+    filament, and each radial row is convolved with the probability at that
+    radial distance, the convolutions being done together by FFT. The tip
+    locations and the kernels don't depend on lattice spacing, so they are
+    found once and each row costs a spread and the transforms. Tips more
+    than 6 nm short of the filament, as well as heads off the grid, have a
+    binding rate below 72*exp(-36), which is taken to be zero.
+
+    A loosely bound head unbinds at the binding rate over exp(-loose), so
+    its chance of unbinding is averaged over the same diffusion. The loose
+    free energy can be large enough that distant tips count, so rather than
+    being tabulated the chance is summed for each head over all the valid
+    tips, gathered for speed into cells of cell nm at their centers of mass.
+    Gathering takes a few sums over the quadrature points, far less than a
+    row of the table, and is redone whenever the lattice spacing moves.
+    """
+    QUANTITIES = ('bind',)
+
+    def __init__(self, heads, timestep, x_range=(-40.0, 40.0), step=0.05,
+                 y_step=0.05, points=(400, 200), cell=0.25):
+        """Create an expected binding table, its rows tabulated as lookups
+        need them
+
+        Parameters:
+            heads: the Heads whose tip diffusion is averaged over
+            timestep: length of the timestep in ms the probabilities are
+                for
+            x_range: span of axial separations to tabulate in nm
+                (-40.0, 40.0)
+            step: spacing of the grid of axial separations in nm (0.05)
+            y_step: spacing of the grid of lattice spacings in nm (0.05)
+            points: number of quadrature points in converter angle and in
+                globular length ((400, 200))
+            cell: size of the cells tips are gathered into for the chance
+                of unbinding in nm (0.25)
+        """
+        super().__init__(heads, x_range, step, y_step)
+        self.timestep = timestep
+        self._log_rate = np.log(72 * timestep)
+        # Quadrature points and their normal weights
+        (c_mean, c_sd), (g_mean, g_sd) = heads.tips.c_bop, heads.tips.g_bop
+        c_z = np.linspace(-5, 5, points[0])
+        g_z = np.linspace(-5, 5, points[1])
+        c_ang = c_mean + c_sd * c_z
+        g_len = g_mean + g_sd * g_z
+        weight = np.outer(np.exp(-c_z**2 / 2), np.exp(-g_z**2 / 2))
+        self._weight = weight.ravel()
+        self._tip_x = np.outer(np.cos(c_ang), g_len).ravel()
+        self._tip_y = np.outer(np.sin(c_ang), g_len).ravel()
+        # Binding probability over axial and radial offsets out to where
+        # it has no effect, transformed for the convolutions
+        reach = int(np.ceil(6 / self.step))
+        offset = self.step * np.arange(-reach, reach + 1)
+        self._radii = self.step * np.arange(reach + 1)
+        kernel = self._saturate(self._log_rate - self._radii[:, None]**2
+                                - offset**2)
+        self._reach = reach
+        self._fft_len = 2**int(np.ceil(np.log2(len(self.x) + 2 * reach)))
+        self._kernel = np.fft.rfft(kernel, self._fft_len, axis=1)
+        # Share each tip out between the grid points to either side of it
+        where = (self._tip_x - self.x[0]) / self.step
+        assert where.min() >= reach and where.max() < len(self.x) - 1 - reach,\
+            "Tip locations come too near the ends of the axial separations"
+        self._bin = where.astype(np.intp)
+        self._frac = where - self._bin
+        # Cell of each tip
+        cells = np.floor(np.column_stack((self._tip_x, self._tip_y)) / cell)
+        self._cell = np.unique(cells, axis=0, return_inverse=True)[1].ravel()
+        self._cells = None
+
+    @staticmethod
+    def _saturate(exponent):
+        """1-exp(-exp(exponent)), the chance of a transition at a rate of
+        exp(exponent) per timestep"""
+        with np.errstate(over='ignore'):
+            return -np.expm1(-np.exp(exponent))
+
+    def _valid(self, y):
+        """Weight of each quadrature point, normalized over the tips that
+        stay short of the thin filament"""
+        valid = self._weight * (self._tip_y <= y)
+        return valid / valid.sum()
+
+    def _evaluate(self, x, y):
+        """Expected binding probability off the grid, where no tip is within
+        6 nm and so the rate is below 72*exp(-36)"""
+        return {'bind': np.zeros(np.shape(x))}
+
+    def _tabulate(self, y):
+        """Expected binding probability along the grid of axial separations
+        at lattice spacing y"""
+        valid = self._valid(y)
+        # Spread the tips near enough to bind over axial and radial offsets
+        where = (y - self._tip_y) / self.step
+        ring = where.astype(np.intp)
+        near = (self._tip_y <= y) & (ring < self._reach)
+        ring, radial_frac = ring[near], (where - ring)[near]
+        axial, axial_frac = self._bin[near], self._frac[near]
+        n = len(self.x)
+        rows = len(self._radii)
+        spread = np.zeros(rows * n)
+        for r, r_share in ((ring, 1 - radial_frac), (ring + 1, radial_frac)):
+            for a, a_share in ((axial, 1 - axial_frac),
+                               (axial + 1, axial_frac)):
+                spread += np.bincount(r * n + a, valid[near] * r_share
+                                      * a_share, rows * n)
+        spread = np.fft.rfft(spread.reshape(rows, n), self._fft_len, axis=1)
+        values = np.fft.irfft((spread * self._kernel).sum(0), self._fft_len)
+        return {'bind': np.clip(values[self._reach:self._reach + n], 0, 1)}
+
+    def _gather(self, y):
+        """The valid tips at lattice spacing y gathered into cells, for the
+        chance of unbinding, kept until the lattice spacing moves
+
+        Returns:
+            (tip_x, tip_y, weight): each cell's center of mass and weight
+        """
+        if self._cells is None or self._cells[0] != y:
+            valid = self._valid(y)
+            total = np.bincount(self._cell, valid)
+            kept = total > 0
+            tip_x = np.bincount(self._cell, valid * self._tip_x)[kept]
+            tip_y = np.bincount(self._cell, valid * self._tip_y)[kept]
+            total = total[kept]
+            self._cells = (y, (tip_x / total, tip_y / total, total))
+        return self._cells[1]
+
+    def unbind(self, x, y, loose, chunk=256):
+        """Expected chance of each loosely bound head unbinding
+
+        Takes:
+            x: array of axial distances from crown to bound actin
+            y: lattice spacing, a scalar
+            loose: loose state free energy of each head
+            chunk: heads summed over the cells at once (256)
+        Returns:
+            prob: chance of each head unbinding over the timestep
+        """
+        tip_x, tip_y, weight = self._gather(y)
+        radial = (y - tip_y)**2
+        x = np.asarray(x, dtype=float)
+        exponent = self._log_rate + np.asarray(loose, dtype=float)
+        prob = np.empty(x.shape)
+        for start in range(0, x.size, chunk):
+            here = slice(start, start + chunk)
+            distance = (x[here, None] - tip_x)**2 + radial
+            prob[here] = (self._saturate(exponent[here, None] - distance)
+                          @ weight)
+        return prob
+
+if __name__ == '__main__':
+    print("heads.py is really meant to be called as a supporting module")
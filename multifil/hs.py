@@ -8,17 +8,28 @@ Created by Dave Williams on 2009-12-31.
 
 import sys
 import os
+import copy
 import multiprocessing as mp
 import time
 import numpy as np
 from . import af
 from . import mf
+from . import heads
+from . import store
+from . import settle
+
+# Mark, and version, the binary formats of hs.to_snapshot
+SNAPSHOT_MAGIC = b'MFSNAP01'
+DELTA_MAGIC = b'MFDELT01'
+
 
 class hs:
     """The half-sarcomere and ways to manage it"""
     def __init__(self, lattice_spacing=None, z_line=None, poisson=None,
                 actin_permissiveness=None, timestep_len=1,
-                time_dependence=None, starts=None):
+                time_dependence=None, starts=None, kinetics=None,
+                rate_table=None, binding=None, settle_method=None,
+                seed=None):
         """ Create the data structure that is the half-sarcomere model
 
         Parameters:
@@ -42,6 +53,35 @@ class hs:
                     * "actin_permissiveness"
             starts: starting polymer/orientation for thin/thick filaments in
                 form ((rand(0,25), ...), (rand(0,3), ...))
+            kinetics: how cross-bridge transitions are evaluated each
+                timestep. Valid values are:
+                    * "batch" - all cross-bridges at once, via heads.Heads,
+                      default value
+                    * "object" - each cross-bridge in turn, via the thick
+                      filament, crown, and mh.Crossbridge transitions
+            rate_table: if True, batch kinetics look the cross-bridge
+                energies and rates up in a heads.RateTable, tabulated over
+                the lattice spacings the run reaches, rather than
+                calculating them (False)
+            binding: how batch kinetics find the chance of a free
+                cross-bridge binding, or a loosely bound one unbinding, over
+                a timestep. Valid values are:
+                    * "stochastic" - at a randomly diffused tip location, as
+                      in mh.Head, default value
+                    * "expected" - averaged over tip diffusion, from a
+                      heads.ExpectedBinding for timestep_len
+            settle_method: how forces are balanced after each timestep.
+                Valid values are:
+                    * "relax" - sweeps that move each node in proportion to
+                      the force on it, default value
+                    * "direct" - linearized solves of the whole spring
+                      network, via settle.DirectSettle, finishing with
+                      relaxation sweeps should those not converge
+                    * "newton" - as "direct", but each solve is by
+                      conjugate gradients, via settle.NewtonSettle
+            seed: seed for numpy's random number generator, from which the
+                filament starts and every stochastic transition are drawn,
+                making the run repeatable (None seeds from the system)
         Returns:
             None
 
@@ -62,6 +102,10 @@ class hs:
         hiding_line:
             x axis location below which actin sites are hidden by actin
             overlap (crossing through the m-line from adjacent half sarc)
+        store:
+            a store.LatticeStore holding, as arrays, the cross-bridge states,
+            which sites and cross-bridges are bound together, actin
+            permissiveness, and the axial locations of every filament node
 
         ## Thick Filament Properties: each is a tuple of thick filaments
         (filament_0, filament_1, filament_2, filament_3) where each
@@ -137,10 +181,14 @@ class hs:
         # Store these values for posterity
         self.lattice_spacing = lattice_spacing
         self.z_line = z_line
+        # The mutable state of the filaments and their cross-bridges and
+        # binding sites is kept in arrays here, registered as they are made
+        self.store = store.LatticeStore()
         # Create the thin filaments, unlinked but oriented on creation.
         thin_orientations = ([4,0,2], [3,5,1], [4,0,2], [3,5,1],
                 [3,5,1], [4,0,2], [3,5,1], [4,0,2])
-        np.random.seed()
+        self.seed = seed
+        np.random.seed(seed)
         if starts is None:
             thin_starts = [np.random.randint(25) for i in thin_orientations]
         else:
@@ -234,6 +282,8 @@ class hs:
             self.thick[1].thick_faces[5], self.thick[2].thick_faces[1]))
         self.thin[7].set_thick_faces((self.thick[1].thick_faces[4],
             self.thick[3].thick_faces[0], self.thick[2].thick_faces[2]))
+        # With everything linked, convert the registered state to arrays
+        self.store.pack()
         # Set the timestep for all our new cross-bridges
         self.timestep_len = timestep_len
         # Set actin_permissiveness for all our new binding sites
@@ -244,6 +294,41 @@ class hs:
         if actin_permissiveness is None:
             actin_permissiveness = 1.0
         self.actin_permissiveness = actin_permissiveness
+        # Choose how transitions are evaluated
+        if kinetics is None:
+            kinetics = "batch"
+        if kinetics not in ("batch", "object"):
+            raise ValueError("Unknown kinetics: %r" % (kinetics,))
+        self.kinetics = kinetics
+        self._heads = heads.Heads(self.store.xbs[0])
+        if rate_table is None:
+            rate_table = False
+        if rate_table not in (True, False):
+            raise ValueError("rate_table must be True or False, not %r"
+                             % (rate_table,))
+        self.rate_table = rate_table
+        if rate_table:
+            self._heads.table = heads.RateTable(self._heads)
+        if binding is None:
+            binding = "stochastic"
+        if binding not in ("stochastic", "expected"):
+            raise ValueError("Unknown binding: %r" % (binding,))
+        self.binding = binding
+        if binding == "expected":
+            self._heads.expected = heads.ExpectedBinding(self._heads,
+                                                         self.timestep_len)
+        # Choose how forces are balanced
+        if settle_method is None:
+            settle_method = "relax"
+        self.settle_method = settle_method
+        if settle_method == "direct":
+            self._settler = settle.DirectSettle(self.thick, self.thin)
+        elif settle_method == "newton":
+            self._settler = settle.NewtonSettle(self.thick, self.thin)
+        elif settle_method != "relax":
+            raise ValueError("Unknown settle_method: %r" % (settle_method,))
+        self.bind_rejection_rate = None
+        self.last_settle = None
         # Track how long we've been running
         self.current_timestep = 0
 
@@ -263,10 +348,18 @@ class hs:
                 "actin_permissiveness" can change
             last_transitions: keeps track of the last state change by thick
                 filament and by crown
+            bind_rejection_rate: fraction of diffused head tips rejected
+                during the last batch transition, None for object kinetics
+                or expected binding
+            last_settle: how the last settle went, see settle
+            seed: the random seed the sarcomere was created with, if any
             thick: the structures for the thick filaments
             thin: the structures for the thin filaments
         """
         sd = self.__dict__.copy() # sarc dict
+        sd.pop('store')
+        sd.pop('_heads')
+        sd.pop('_settler', None)
         sd['current_timestep'] = self.current_timestep
         # set act_perm as mean since prop access returns values at every point
         sd['actin_permissiveness'] = np.mean(self.actin_permissiveness)
@@ -292,21 +385,211 @@ class hs:
             actin_permissiveness=sd['actin_permissiveness'],
             timestep_len=sd['timestep_len'],
             time_dependence=sd['time_dependence'],
-            starts=(sd['_thin_starts'], sd['_thick_starts'])
+            starts=(sd['_thin_starts'], sd['_thick_starts']),
+            kinetics=sd.get('kinetics'),
+            rate_table=sd.get('rate_table'),
+            binding=sd.get('binding'),
+            settle_method=sd.get('settle_method')
             )
         # Local keys
+        self.seed = sd.get('seed')
         self.current_timestep = sd['current_timestep']
         self._z_line = sd['_z_line']
         self._lattice_spacing = sd['_lattice_spacing']
         self.hiding_line = sd['hiding_line']
         if 'last_transitions' in sd.keys():
             self.last_transitions = sd['last_transitions']
+        self.bind_rejection_rate = sd.get('bind_rejection_rate')
+        self.last_settle = sd.get('last_settle')
         # Sub-structure keys
         for data, thick in zip(sd['thick'], self.thick):
             thick.from_dict(data)
         for data, thin in zip(sd['thin'], self.thin):
             thin.from_dict(data)
 
+    def same_lattice(self, sd):
+        """Whether a sarcomere dict is of a lattice built as this one was,
+        with the same filament starts and options, so that restore can
+        load it in place"""
+        built = lambda key, default: default if sd.get(key) is None \
+                else sd[key]
+        return all([
+            sd['version'] == self.version,
+            list(sd['_thin_starts']) == list(self._thin_starts),
+            list(sd['_thick_starts']) == list(self._thick_starts),
+            sd['_initial_z_line'] == self._initial_z_line,
+            sd['_initial_lattice_spacing'] == self._initial_lattice_spacing,
+            sd['timestep_len'] == self.timestep_len,
+            built('rate_table', False) == self.rate_table,
+            built('binding', "stochastic") == self.binding,
+            built('settle_method', "relax") == self.settle_method])
+
+    def restore(self, sd):
+        """Load the state of a sarcomere dict in place, without rebuilding
+        the lattice as from_dict does. Only what changes as the model runs
+        is read: the cross-bridge states and what they are bound to, site
+        permissiveness, filament node locations, and the boundary
+        conditions. The dict must be of the same lattice, see same_lattice.
+        """
+        if not self.same_lattice(sd):
+            raise ValueError("Sarcomere dict is of a lattice with other "
+                             "starts or options")
+        st = self.store
+        # Cross-bridge and site dicts, in the order of their objects' ids
+        xb_ids = [xb._id for thick in self.thick
+                  for face in thick.thick_faces for xb in face.xb]
+        xb_dicts = [xbd for td in sd['thick']
+                    for face in td['thick_faces'] for xbd in face['xb']]
+        site_ids = [site._id for thin in self.thin
+                    for site in thin.binding_sites]
+        site_dicts = [bsd for td in sd['thin']
+                      for bsd in td['binding_sites']]
+        # Sites are bound to by address, ('bs', thin index, site index)
+        numeric = {"free":0, "loose":1, "tight":2}
+        site_id = lambda address: -1 if address is None else \
+                np.ravel_multi_index(address[1:], st.thin_axial.shape)
+        st.xb_state[xb_ids] = [numeric[xbd['state']] for xbd in xb_dicts]
+        st.xb_bound[xb_ids] = [site_id(xbd['bound_to']) for xbd in xb_dicts]
+        st.permissiveness[site_ids] = [bsd['permissiveness']
+                                       for bsd in site_dicts]
+        st.thick_axial[...] = [td['axial'] for td in sd['thick']]
+        st.thin_axial[...] = [td['axial'] for td in sd['thin']]
+        st.relink()
+        st.thin_moved()
+        # Local keys, the boundary conditions set directly as the setters
+        # would apply them anew
+        self.seed = sd.get('seed')
+        self.poisson_ratio = sd['poisson_ratio']
+        self.time_dependence = sd['time_dependence']
+        self.kinetics = sd.get('kinetics') or "batch"
+        self._current_timestep = sd['current_timestep']
+        self._z_line = sd['_z_line']
+        self._lattice_spacing = sd['_lattice_spacing']
+        self.hiding_line = sd['hiding_line']
+        if 'last_transitions' in sd.keys():
+            self.last_transitions = sd['last_transitions']
+        self.bind_rejection_rate = sd.get('bind_rejection_rate')
+        self.last_settle = sd.get('last_settle')
+
+    def clone(self, seed=None):
+        """An independent copy of the sarcomere, in its current state
+
+        This builds a whole new lattice with this one's starts, costing
+        about as much as creating a sarcomere, so it suits trying a few
+        futures of a sarcomere in hand; many runs that share their first
+        timesteps are better branched from a checkpoint, see
+        aws.local.run_branches. The state is copied over as a snapshot
+        rather than through to_dict, and the settler's backbone
+        stiffnesses and the grids of any rate or expected binding tables
+        are shared rather than found again. The copy has a settler and
+        tables of its own, so that it can rebuild its tables at a lattice
+        spacing apart from this one's. The draws of every sarcomere come
+        from numpy's one random number generator; cloning leaves it as it
+        was, so the copy carries on the draws this sarcomere would have
+        made, unless a new seed is given.
+
+        Parameters:
+            seed: if given, the random number generator is seeded with
+                this, as by creating the copy with this seed, so that the
+                copy's run is repeatable apart from this one's (None)
+        Returns:
+            twin: the copy, an hs.hs
+        """
+        # Build with the default options, then share those of this lattice
+        random_state = np.random.get_state()
+        twin = hs(lattice_spacing=self._initial_lattice_spacing,
+                  z_line=self._initial_z_line, poisson=self.poisson_ratio,
+                  timestep_len=self.timestep_len,
+                  time_dependence=self.time_dependence,
+                  starts=(self._thin_starts, self._thick_starts),
+                  kinetics=self.kinetics)
+        np.random.set_state(random_state)
+        twin.rate_table = self.rate_table
+        twin.binding = self.binding
+        twin.settle_method = self.settle_method
+        if self._heads.table is not None:
+            twin._heads.table = self._heads.table.copy(twin._heads)
+        if self._heads.expected is not None:
+            twin._heads.expected = self._heads.expected.copy(twin._heads)
+        if hasattr(self, '_settler'):
+            twin._settler = copy.copy(self._settler)
+        twin._heads.tips._acceptance = self._heads.tips._acceptance
+        # Copy the state
+        twin.from_snapshot(self.to_snapshot())
+        twin.seed = self.seed
+        if hasattr(self, 'last_transitions'):
+            twin.last_transitions = self.last_transitions
+        twin.bind_rejection_rate = self.bind_rejection_rate
+        twin.last_settle = self.last_settle
+        if seed is not None:
+            twin.seed = seed
+            np.random.seed(seed)
+        return twin
+
+    def to_snapshot(self, since=None):
+        """Create a compact binary representation of the sarcomere's state
+
+        Only what changes as the model runs is written, as flat arrays: the
+        cross-bridge states, the sites they are bound to, permissiveness,
+        the filament node locations, and the current timestep, z-line,
+        lattice spacing, and hiding line. This is far smaller and quicker
+        to write than to_dict, but can only be read by from_snapshot into a
+        half-sarcomere with the same filament starts and options, such as
+        one made with the same starts or loaded by from_dict.
+
+        Parameters:
+            since: an earlier full snapshot of this sarcomere, if given
+                only what has changed since then is written, in a delta
+                that from_snapshot can load onto that earlier state (None)
+        Returns:
+            snapshot: bytes
+        """
+        starts = np.array(list(self._thin_starts) + list(self._thick_starts),
+                          dtype=np.int32)
+        values = np.array([self.current_timestep, self.z_line,
+                           self.lattice_spacing, self.hiding_line])
+        if since is None:
+            return b''.join([SNAPSHOT_MAGIC, starts.tobytes(),
+                             values.tobytes(), self.store.to_bytes()])
+        header = len(SNAPSHOT_MAGIC) + starts.nbytes + values.nbytes
+        return b''.join([DELTA_MAGIC, starts.tobytes(), values.tobytes(),
+                         self.store.to_bytes(since, header)])
+
+    def from_snapshot(self, snapshot):
+        """Load the state written by to_snapshot, in place. A delta must be
+        loaded onto the state it was written since."""
+        magic = snapshot[:len(SNAPSHOT_MAGIC)]
+        if magic not in (SNAPSHOT_MAGIC, DELTA_MAGIC):
+            raise ValueError("Not a sarcomere snapshot")
+        offset = len(SNAPSHOT_MAGIC)
+        n_starts = len(self._thin_starts) + len(self._thick_starts)
+        starts = np.frombuffer(snapshot, np.int32, n_starts, offset)
+        if list(starts) != list(self._thin_starts) + list(self._thick_starts):
+            raise ValueError("Snapshot is of a lattice with other starts")
+        offset += starts.nbytes
+        values = np.frombuffer(snapshot, float, 4, offset)
+        self.store.from_bytes(snapshot, offset + values.nbytes,
+                              changes=(magic == DELTA_MAGIC))
+        # Set directly, as the setters would apply boundary conditions
+        timestep, self._z_line, self._lattice_spacing, self.hiding_line = \
+                values.tolist()
+        self._current_timestep = int(timestep)
+
+    def get_random_state(self):
+        """The state of the random draws, as a JSON compatible dict, from
+        which set_random_state can continue a run exactly"""
+        name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+        return {'numpy': [name, keys.tolist(), pos, has_gauss,
+                          cached_gaussian],
+                'tip_acceptance': float(self._heads.tips._acceptance)}
+
+    def set_random_state(self, state):
+        """Restore the state of the random draws from get_random_state"""
+        name, keys, pos, has_gauss, cached_gaussian = state['numpy']
+        np.random.set_state((name, np.array(keys, dtype=np.uint32), pos,
+                             has_gauss, cached_gaussian))
+        self._heads.tips._acceptance = state['tip_acceptance']
+
     def run(self, time_steps=100, callback=None, bar=True):
         """Run the model for the specified number of timesteps
 
@@ -315,7 +598,8 @@ class hs:
             callback: function to be executed after each time step to
                 collect data. The callback function takes the sarcomere
                 in its current state as its only argument. (Defaults to
-                the axial force at the M-line if not specified.)
+                the axial force at the M-line if not specified.) The cost
+                of the timestep's settle is in sarc.last_settle.
             bar: progress bar control,False means don't display, True
                 means give us the basic progress reports, if a function
                 is passed, it will be called as f(completed_steps,
@@ -356,10 +640,72 @@ class hs:
         else:
             self.current_timestep += 1
         # Update bound states
-        self.last_transitions = [thick.transition() for thick in self.thick]
+        if self.kinetics == "batch":
+            self.last_transitions = self._batch_transition()
+        else:
+            self.last_transitions = [thick.transition()
+                                     for thick in self.thick]
         # Settle forces
         self.settle()
 
+    def _batch_transition(self):
+        """Give every cross-bridge a chance to transition, all at once
+
+        Returns:
+            transitions: as from the thick filaments' transition methods, a
+                list by thick filament of lists by crown of transitions
+        """
+        trans = self._transition_heads(self.hiding_line)
+        return self._group_transitions(trans)
+
+    def _transition_heads(self, hiding_line):
+        """Transition every cross-bridge in the store together
+
+        Each cross-bridge's actin site is its bound site or, if unbound, the
+        nearest site on its thin face. The heads are transitioned together
+        and the resulting states, bindings, and unbindings written to the
+        store.
+
+        Parameters:
+            hiding_line: the hiding line, or the hiding line each
+                cross-bridge sees
+        Returns:
+            trans: integer transition code of each cross-bridge, see heads
+        """
+        st = self.store
+        tips = self._heads.tips
+        tips.reset()
+        sites = st.xb_bound.copy()
+        free = np.flatnonzero(sites < 0)
+        hiding_line = np.broadcast_to(hiding_line, sites.shape)[free]
+        sites[free] = st.nearest_sites(st.xb_face[free],
+                                       st.crown_axial[st.xb_node[free]],
+                                       hiding_line)
+        axial_sep = st.site_axial[sites] - st.crown_axial[st.xb_node]
+        new_state, trans = self._heads.transition(
+            st.xb_state, axial_sep, self.lattice_spacing,
+            st.permissiveness[sites], self.timestep_len)
+        self.bind_rejection_rate = tips.rejection_rate
+        # Process changes to bound states
+        st.xb_state[:] = new_state
+        binding = trans == 12
+        st.unbind(np.flatnonzero((trans == 21) | (trans == 31)))
+        st.bind(np.flatnonzero(binding), sites[binding])
+        return trans
+
+    def _group_transitions(self, trans):
+        """Regroup transition codes by thick filament and crown
+
+        Parameters:
+            trans: integer transition code of each of our cross-bridges
+        Returns:
+            transitions: a list by thick filament of lists by crown of the
+                string transitions, as from the thick filaments
+        """
+        trans = [heads.TRANSITIONS.get(t) for t in trans]
+        return [[[trans[xb._id] for xb in crown.crossbridges]
+                 for crown in thick.crowns] for thick in self.thick]
+
     @property
     def current_timestep(self):
         """Return the current timestep"""
@@ -390,8 +736,7 @@ class hs:
     @actin_permissiveness.setter
     def actin_permissiveness(self, new_permissiveness):
         """Assign all binding sites the new permissiveness, 0 to 1"""
-        for thin in self.thin:
-            thin.permissiveness = new_permissiveness
+        self.store.permissiveness[:] = new_permissiveness
 
     @property
     def z_line(self):
@@ -466,18 +811,96 @@ class hs:
         """Sum of each thick filament's axial force on the M-line """
         return sum([thick.effective_axial_force() for thick in self.thick])
 
-    def radialtension(self):
-        """The sum of the thick filaments' radial tensions"""
-        return sum([t.radialtension() for t in self.thick])
+    def radialtension(self, forces=None):
+        """The sum of the thick filaments' radial tensions, from the
+        cross-bridge forces of _bound_xb_forces if already found"""
+        if forces is None:
+            forces = self._bound_xb_forces()
+        radial = forces[2]
+        return np.sum(radial)
 
-    def radialforce(self):
-        """The sum of the thick filaments' radial forces, as a (y,z) vector"""
-        return np.sum([t.radial_force_of_filament() for t in self.thick], 0)
+    def radialforce(self, forces=None):
+        """The sum of the thick filaments' radial forces, as a (y,z) vector,
+        from the cross-bridge forces of _bound_xb_forces if already found"""
+        if forces is None:
+            forces = self._bound_xb_forces()
+        bound, _, radial = forces
+        return radial.dot(self.store.xb_orient[bound])
+
+    def _bound_xb_forces(self):
+        """The axial and radial force of every bound cross-bridge at once
+
+        Returns:
+            (bound, axial, radial): the ids of the bound cross-bridges and
+                the axial and radial forces each generates
+        """
+        st = self.store
+        bound = np.flatnonzero(st.xb_bound >= 0)
+        dist = st.site_axial[st.xb_bound[bound]] - \
+            st.crown_axial[st.xb_node[bound]]
+        state = st.xb_state[bound]
+        ls = self.lattice_spacing
+        return (bound, self._heads.axialforce(dist, ls, state),
+                self._heads.radialforce(dist, ls, state))
+
+    def _thick_axial_forces(self, xb_forces=None):
+        """Axial force on each crown, from the thick filament backbones
+        and bound cross-bridges, by (thick filament index, crown index),
+        from the cross-bridge forces of _bound_xb_forces if already found"""
+        st = self.store
+        # Backbone springs, see ThickFilament._axial_thick_filament_forces
+        rests = np.array([thick.rests for thick in self.thick])
+        k = np.array([[thick.k] for thick in self.thick])
+        dists = np.diff(st.thick_axial, axis=1, prepend=0)
+        spring_force = (dists - rests) * k
+        forces = np.diff(spring_force, axis=1, append=0)
+        # Cross-bridges pull on their crowns
+        if xb_forces is None:
+            xb_forces = self._bound_xb_forces()
+        bound, axial, _ = xb_forces
+        forces += np.bincount(st.xb_node[bound], axial,
+                              st.thick_axial.size).reshape(forces.shape)
+        return forces
+
+    def _thin_axial_forces(self, xb_forces=None):
+        """Axial force on each node, from the thin filament backbones
+        and bound cross-bridges, by (thin filament index, node index),
+        from the cross-bridge forces of _bound_xb_forces if already found"""
+        st = self.store
+        # Backbone springs, see ThinFilament._axial_thin_filament_forces
+        rests = np.array([thin.rests for thin in self.thin])
+        k = np.array([[thin.k] for thin in self.thin])
+        dists = np.diff(st.thin_axial, axis=1, append=self.z_line)
+        spring_force = (dists - rests) * k
+        forces = np.diff(spring_force, axis=1, prepend=0)
+        # Equal but opposite to the pull on the crowns
+        if xb_forces is None:
+            xb_forces = self._bound_xb_forces()
+        bound, axial, _ = xb_forces
+        forces -= np.bincount(st.xb_bound[bound], axial,
+                              st.thin_axial.size).reshape(forces.shape)
+        return forces
 
     def _single_settle(self, factor=0.95):
-        """Settle down now, just a little bit"""
-        thick = [thick.settle(factor) for thick in self.thick]
-        thin = [thin.settle(factor) for thin in self.thin]
+        """Settle down now, just a little bit
+
+        As in ThickFilament.settle and ThinFilament.settle, each node is
+        moved in proportion to the force on it, carrying those further
+        from the filament's anchor with it. Thick filaments move first and
+        the thin filaments then balance against their new locations.
+        """
+        st = self.store
+        thick = self._thick_axial_forces()
+        isolated = factor * thick / np.array([[t.k] for t in self.thick])
+        isolated[:, -1] *= 2 # Last node has spring on only one side
+        st.thick_axial += np.cumsum(isolated, axis=1)
+        # The thin filaments balance against the moved crowns, so the
+        # cross-bridge forces are found again
+        thin = self._thin_axial_forces()
+        isolated = factor * thin / np.array([[t.k] for t in self.thin])
+        isolated[:, 0] *= 2 # First node has spring on only one side
+        st.thin_axial += np.cumsum(isolated[:, ::-1], axis=1)[:, ::-1]
+        st.thin_moved()
         return np.max((np.max(np.abs(thick)), np.max(np.abs(thin))))
 
     def settle(self):
@@ -486,26 +909,66 @@ class hs:
         We choose the convergence limit so that 95% of thermal forcing events
         result in a deformation that produces more axial force than the
         convergence value, 0.12pN.
+
+        How it went is recorded in last_settle, a dict of:
+            sweeps: number of relaxation sweeps taken
+            solves: number of linearized solves taken, for the "direct" and
+                "newton" settle methods
+            residual: the largest residual force at the final check
+            time: seconds spent settling
         """
+        tic = time.time()
         converge_limit=0.12 # see doc string
-        converge = self._single_settle()
+        sweeps, solves = 0, 0
+        if self.settle_method in ("direct", "newton"):
+            converge, solves = self._network_settle(converge_limit)
+        else:
+            converge = self._single_settle()
+            sweeps += 1
         while converge>converge_limit:
             converge = self._single_settle()
+            sweeps += 1
+        self.last_settle = {'sweeps': sweeps, 'solves': solves,
+                            'residual': float(converge),
+                            'time': time.time() - tic}
+
+    def _network_settle(self, converge_limit, max_solves=10):
+        """Settle by repeated linearized solves, see settle.DirectSettle
+        and settle.NewtonSettle
+
+        Parameters:
+            converge_limit: residual force below which we are settled
+            max_solves: most solves to make before giving up (10)
+        Returns:
+            (converge, solves): the largest remaining residual force and the
+                number of solves made
+        """
+        st = self.store
+        for i in range(max_solves + 1):
+            xb_forces = self._bound_xb_forces()
+            thick_f = self._thick_axial_forces(xb_forces)
+            thin_f = self._thin_axial_forces(xb_forces)
+            converge = max(np.max(np.abs(thick_f)), np.max(np.abs(thin_f)))
+            if converge <= converge_limit or i == max_solves:
+                break
+            thick_step, thin_step = self._settler.step(
+                st, self._heads, self.lattice_spacing, thick_f, thin_f)
+            st.thick_axial += thick_step
+            st.thin_axial += thin_step
+            st.thin_moved()
+        return converge, i
 
     def _get_residual(self):
         """Get the residual force at every point in the half-sarcomere"""
-        thick_f = np.hstack([t.axialforce() for t in self.thick])
-        thin_f = np.hstack([t.axialforce() for t in self.thin])
+        xb_forces = self._bound_xb_forces()
+        thick_f = self._thick_axial_forces(xb_forces).ravel()
+        thin_f = self._thin_axial_forces(xb_forces).ravel()
         mash = np.hstack([thick_f, thin_f])
         return mash
 
     def get_frac_in_states(self):
         """Calculate the fraction of cross-bridges in each state"""
-        nested = [t.get_states() for t in self.thick]
-        xb_states = [xb for fil in nested for face in fil for xb in face]
-        num_in_state = [xb_states.count(state) for state in range(3)]
-        frac_in_state = [n/float(len(xb_states)) for n in num_in_state]
-        return frac_in_state
+        return list(self.store.frac_in_states())
 
     def update_ls_from_poisson_ratio(self):
         """Update the lattice spacing consistant with the poisson ratio,
@@ -548,7 +1011,7 @@ class hs:
 
     def update_hiding_line(self):
         """Update the line determining which actin sites are unavailable"""
-        farthest_actin = min([min(thin.axial) for thin in self.thin])
+        farthest_actin = np.min(self.store.thin_axial)
         self.hiding_line = -farthest_actin
 
     def resolve_address(self, address):
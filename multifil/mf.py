@@ -137,7 +137,7 @@ class ThickFace:
         Parameters:
             parent_filament: the thick filament supporting this face
             axial_locations: the axial locations of nodes along the face,
-                we want this list kept linked to the filament's version
+                afterwards read from the filament so they stay linked
             thin_face: the thin filament face located opposite
             index: the numerical orientation index of this face (0-5)
             start: what crown level this face starts on (1, 2, or 3)
@@ -147,7 +147,6 @@ class ThickFace:
         self.thin_face = thin_face
         self.index = index # numerical orientation (0-5)
         self.address = ('thick_face', self.parent_filament.index, self.index)
-        self.axial_locations = axial_locations
         # Instantiate the cross-bridges along the face
         self.xb = []
         self.xb_by_crown = [] # Includes levels with no heads
@@ -211,6 +210,7 @@ class ThickFace:
         thickfaced = self.__dict__.copy()
         thickfaced.pop('index')
         thickfaced.pop('parent_filament')
+        thickfaced['axial_locations'] = list(self.axial_locations)
         thickfaced['thin_face'] = thickfaced['thin_face'].address
         thickfaced['xb'] = [xb.to_dict() for xb in thickfaced['xb']]
         thickfaced['xb_by_crown'] = [xb.address if xb is not None else None\
@@ -224,8 +224,7 @@ class ThickFace:
         # Check for index mismatch
         read, current = tuple(tfd['address']), self.address
         assert read==current, "index mismatch at %s/%s"%(read, current)
-        # Local keys
-        self.axial_locations = tfd['axial_locations']
+        # Local keys, axial_locations are loaded by the parent filament
         self.xb_index = tfd['xb_index']
         # Sub-structure and remote keys
         self.thin_face = self.parent_filament.parent_lattice.resolve_address(
@@ -285,6 +284,11 @@ class ThickFace:
         """Return the numeric states (0,1,2) of all cross-bridges"""
         return [xb.numeric_state for xb in self.xb]
 
+    @property
+    def axial_locations(self):
+        """The axial locations of nodes along the face"""
+        return self.parent_filament.axial
+
     @property
     def lattice_spacing(self):
         """Return lattice spacing to the face's opposite number"""
@@ -408,7 +412,8 @@ class ThickFilament:
         bare_zone = 58 # Length of the area before any crowns, nm
         crown_spacing = 14.3 # Spacing between adjacent crowns, nm
         n_cr = 60 # Number of myosin crowns
-        self.axial = [bare_zone + n*crown_spacing for n in range(n_cr)]
+        self.parent_lattice.store.add_thick(
+            [bare_zone + n*crown_spacing for n in range(n_cr)])
         self.rests = np.diff(np.hstack([0, self.axial]))
         # Instantiate the faces
         self.thick_faces = []
@@ -434,6 +439,8 @@ class ThickFilament:
                 crown_orientations[index]))
         # Thick filament properties to remember
         self.number_of_crowns = n_cr
+        xbs = [xb for face in self.thick_faces for xb in face.xb]
+        self._xb_ids = slice(xbs[0]._id, xbs[-1]._id + 1)
         self.thin_faces = thin_faces
         self.k = 2020 # Spring constant of thick filament in pN/nm
         self.b_z = bare_zone
@@ -464,7 +471,8 @@ class ThickFilament:
         thickd = self.__dict__.copy()
         thickd.pop('index')
         thickd.pop('parent_lattice')
-        thickd['axial'] = list(thickd['axial'])
+        thickd.pop('_xb_ids')
+        thickd['axial'] = list(self.axial)
         thickd['crowns'] = [crown.to_dict() for crown in thickd['crowns']]
         thickd['rests'] = list(thickd['rests'])
         thickd['thick_faces'] = [face.to_dict() for face in\
@@ -527,11 +535,16 @@ class ThickFilament:
         """Return the total cross-bridge force on each crown
         This does not take into account the force from thick filament springs
         """
-        if axial_locations == None:
-            axial_force = [cr.axialforce() for cr in self.crowns]
-        else:
-            axial_force = [cr.axialforce(loc) for
-                    cr,loc in zip(self.crowns, axial_locations)]
+        # Only bound cross-bridges generate force, the store says which
+        store = self.parent_lattice.store
+        bound = np.flatnonzero(store.xb_bound[self._xb_ids] >= 0)
+        axial_force = np.zeros(self.number_of_crowns)
+        for xb in [store.xbs[self._xb_ids.start + i] for i in bound]:
+            if axial_locations is None:
+                axial_force[xb.index] += xb.axialforce()
+            else:
+                axial_force[xb.index] += xb.axialforce(
+                    axial_locations[xb.index])
         return axial_force
 
     def axialforce(self, axial_locations=None):
@@ -612,6 +625,16 @@ class ThickFilament:
         """Return the axial location at the given crown index"""
         return self.axial[index]
 
+    @property
+    def axial(self):
+        """Axial locations of the crowns, a view into the lattice's store"""
+        return self.parent_lattice.store.thick_axial[self.index]
+
+    @axial.setter
+    def axial(self, new_axial):
+        """Copy new crown locations into the lattice's store"""
+        self.parent_lattice.store.thick_axial[self.index][:] = new_axial
+
     def get_states(self):
         """Return the numeric states (0,1,2) of each face's cross-bridges"""
         return [face.get_states() for face in self.thick_faces]
@@ -603,6 +603,10 @@ class Crossbridge(Head):
             parent_face: the associated thick filament face
             thin_face: the face instance opposite this cross-bridge
         """
+        # Keep mutable state in the lattice's store, registering before the
+        # parent Head sets our state
+        self._store = parent_face.parent_filament.parent_lattice.store
+        self._id = self._store.add_xb(self)
         # Do that super() voodoo that instantiates the parent Head
         super(Crossbridge, self).__init__()
         # What is your name, where do you sit on the parent face?
@@ -641,8 +645,12 @@ class Crossbridge(Head):
         xbd.pop('c')
         xbd.pop('g')
         xbd.pop('parent_face')
-        if xbd['bound_to'] is not None:
-            xbd['bound_to'] = xbd['bound_to'].address
+        xbd.pop('_store')
+        xbd.pop('_id')
+        xbd['state'] = self.state
+        xbd['bound_to'] = None
+        if self.bound_to is not None:
+            xbd['bound_to'] = self.bound_to.address
         xbd['thin_face'] = xbd['thin_face'].address
         return xbd
 
@@ -666,6 +674,36 @@ class Crossbridge(Head):
             self.bound_to = self.parent_face.parent_filament.parent_lattice.\
                 resolve_address(xbd['bound_to'])
 
+    @property
+    def state(self):
+        """Kinetic state, ['free'|'loose'|'tight'], kept in the store"""
+        return ("free", "loose", "tight")[self._store.xb_state[self._id]]
+
+    @state.setter
+    def state(self, new_state):
+        """Record a new kinetic state in the store"""
+        lookup_state = {"free":0, "loose":1, "tight":2}
+        self._store.xb_state[self._id] = lookup_state[new_state]
+
+    @property
+    def numeric_state(self):
+        """Return the numeric state (0, 1, or 2) of the head"""
+        return int(self._store.xb_state[self._id])
+
+    @property
+    def bound_to(self):
+        """The bound BindingSite, None if unbound"""
+        site_id = self._store.xb_bound[self._id]
+        if site_id < 0:
+            return None
+        return self._store.sites[site_id]
+
+    @bound_to.setter
+    def bound_to(self, binding_site):
+        """Record the bound binding site (or None) in the store"""
+        site_id = -1 if binding_site is None else binding_site._id
+        self._store.xb_bound[self._id] = site_id
+
     @property
     def timestep(self):
         """Timestep size is stored at the half-sarcomere level"""
@@ -759,8 +797,7 @@ class Crossbridge(Head):
         Returns:
             axial: the axial location of the cross-bridge base
         """
-        axial = self.parent_face.get_axial_location(self.index)
-        return axial
+        return self._store.crown_axial[self._store.xb_node[self._id]]
 
     def _dist_to_bound_actin(self, xb_axial_loc=None, tip_axial_loc=None):
 
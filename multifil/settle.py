@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+settle.py - Solve for the axial locations that balance the lattice's forces
+
+hs.settle by default relaxes the filaments a sweep at a time, each node moved
+in proportion to the force on it, until the residual force is low. The stiff
+filament backbones mean that takes many sweeps. The solvers here instead
+treat the lattice as one network of springs and solve for its balance.
+
+Each filament's backbone is a chain of linear springs, so the backbone's
+contribution to the force on each node is -K u plus a constant, where u is
+the nodes' axial locations and K is tridiagonal. K is fixed, so the inverse
+of each filament's block is found once. Bound cross-bridges couple a crown
+to a binding site with a nonlinear spring. Taking each one's force as
+linear about the current locations, with stiffness k_xb, the change in
+locations that balances the forces is the solution of
+
+    (K + B diag(k_xb) B^T) du = F
+
+where F is the residual force on each node and each column of B is +1 at a
+cross-bridge's crown and -1 at its binding site. The cross-bridges are few
+next to the nodes, so this is solved through the backbone inverse with the
+Woodbury identity, leaving only a system the size of the number of bound
+cross-bridges to factor. Repeating this from the new locations is a Newton
+iteration.
+
+NewtonSettle takes the same Newton steps but solves each by preconditioned
+conjugate gradients, with the backbone inverse as the preconditioner, so
+nothing needs to be factored as more cross-bridges bind.
+"""
+
+import numpy as np
+
+
+class DirectSettle:
+    """Settle the lattice by linearized solves of the whole spring network"""
+    def __init__(self, thick, thin):
+        """Find each filament's backbone stiffness and its inverse
+
+        Parameters:
+            thick: the half-sarcomere's thick filaments
+            thin: the half-sarcomere's thin filaments
+        """
+        # Thick filaments are anchored at the M-line, their last crown free
+        self.thick_k = np.array([self._chain(len(f.axial), f.k, free=-1)
+                                 for f in thick])
+        # Thin filaments are anchored at the Z-line, their first node free
+        self.thin_k = np.array([self._chain(len(f.axial), f.k, free=0)
+                                for f in thin])
+        self.thick_inv = np.linalg.inv(self.thick_k)
+        self.thin_inv = np.linalg.inv(self.thin_k)
+
+    @staticmethod
+    def _chain(n, k, free):
+        """Stiffness matrix of a chain of n nodes joined by springs of
+        constant k, anchored at one end and free at the other"""
+        stiffness = k * (2 * np.eye(n) - np.eye(n, k=1) - np.eye(n, k=-1))
+        stiffness[free, free] = k
+        return stiffness
+
+    @staticmethod
+    def _apply(inverse, force):
+        """Multiply each filament's row of force by its block inverse"""
+        return np.einsum('fij,fj->fi', inverse, force)
+
+    @staticmethod
+    def _linearize(store, heads, lattice_spacing):
+        """Crown, site, and axial stiffness of each bound cross-bridge"""
+        bound = np.flatnonzero(store.xb_bound >= 0)
+        crowns = store.xb_node[bound]
+        sites = store.xb_bound[bound]
+        separation = store.site_axial[sites] - store.crown_axial[crowns]
+        stiffness = heads.axial_stiffness(separation, lattice_spacing,
+                                          store.xb_state[bound])
+        return crowns, sites, stiffness
+
+    def step(self, store, heads, lattice_spacing, thick_force, thin_force):
+        """Solve the linearized network for the change in locations
+
+        Takes:
+            store: the lattice's store.LatticeStore
+            heads: a heads.Heads to find cross-bridge stiffness with
+            lattice_spacing: the current lattice spacing
+            thick_force: residual force on each crown, by (thick filament
+                index, crown index)
+            thin_force: residual force on each node, by (thin filament
+                index, node index)
+        Returns:
+            (thick_step, thin_step): the change in location of each crown
+                and each thin filament node
+        """
+        thick_step = self._apply(self.thick_inv, thick_force)
+        thin_step = self._apply(self.thin_inv, thin_force)
+        # Where each bound cross-bridge attaches, and how stiff it is
+        crowns, sites, stiffness = self._linearize(store, heads,
+                                                   lattice_spacing)
+        if len(crowns) == 0:
+            return thick_step, thin_step
+        n_crowns = store.thick_axial.shape[1]
+        n_nodes = store.thin_axial.shape[1]
+        thick_f, crown_i = np.divmod(crowns, n_crowns)
+        thin_f, site_i = np.divmod(sites, n_nodes)
+        # B^T K^-1 B, nonzero only between cross-bridges sharing a filament
+        capacitance = (
+            self.thick_inv[thick_f[:, None], crown_i[:, None], crown_i] *
+            (thick_f[:, None] == thick_f) +
+            self.thin_inv[thin_f[:, None], site_i[:, None], site_i] *
+            (thin_f[:, None] == thin_f))
+        # Woodbury: du = y - K^-1 B (I + D B^T K^-1 B)^-1 D B^T y, y = K^-1 F
+        stretch = thick_step.ravel()[crowns] - thin_step.ravel()[sites]
+        system = np.eye(len(crowns)) + stiffness[:, None] * capacitance
+        tension = np.linalg.solve(system, stiffness * stretch)
+        thick_pull = np.bincount(crowns, tension, store.thick_axial.size)
+        thin_pull = np.bincount(sites, -tension, store.thin_axial.size)
+        thick_step -= self._apply(self.thick_inv,
+                                  thick_pull.reshape(thick_step.shape))
+        thin_step -= self._apply(self.thin_inv,
+                                 thin_pull.reshape(thin_step.shape))
+        return thick_step, thin_step
+
+
+class NewtonSettle(DirectSettle):
+    """Settle the lattice by Newton steps solved with conjugate gradients"""
+    def __init__(self, thick, thin, tol=0.01, max_iter=200):
+        """Find each filament's backbone stiffness and its inverse
+
+        Parameters:
+            thick: the half-sarcomere's thick filaments
+            thin: the half-sarcomere's thin filaments
+            tol: largest force in pN left unbalanced by a step's
+                linearized solve (0.01)
+            max_iter: most conjugate gradient iterations per step (200)
+        """
+        super().__init__(thick, thin)
+        self.tol = tol
+        self.max_iter = max_iter
+        self.iterations = 0 # taken by the last step
+
+    def step(self, store, heads, lattice_spacing, thick_force, thin_force):
+        """Solve the linearized network for the change in locations
+
+        Takes and returns the same as DirectSettle.step. The network's
+        stiffness is positive definite so long as the backbones outweigh any
+        cross-bridges of negative stiffness; should it not be, the solve
+        stops early and the step goes as far as it got.
+        """
+        crowns, sites, stiffness = self._linearize(store, heads,
+                                                   lattice_spacing)
+        thick_shape, thin_shape = thick_force.shape, thin_force.shape
+        n = thick_force.size
+        split = lambda v: (v[:n].reshape(thick_shape),
+                           v[n:].reshape(thin_shape))
+        join = lambda a, b: np.concatenate((a.ravel(), b.ravel()))
+        def operate(v):
+            """Stiffness of the linearized network times v"""
+            thick_v, thin_v = split(v)
+            pull = stiffness * (thick_v.ravel()[crowns] -
+                                thin_v.ravel()[sites])
+            return join(
+                self._apply(self.thick_k, thick_v) +
+                np.bincount(crowns, pull, n).reshape(thick_shape),
+                self._apply(self.thin_k, thin_v) -
+                np.bincount(sites, pull, v.size - n).reshape(thin_shape))
+        def precondition(v):
+            """Backbone inverse times v"""
+            thick_v, thin_v = split(v)
+            return join(self._apply(self.thick_inv, thick_v),
+                        self._apply(self.thin_inv, thin_v))
+        # Conjugate gradients, from the backbone-only solution
+        force = join(thick_force, thin_force)
+        step = precondition(force)
+        residual = force - operate(step)
+        search = precondition(residual)
+        rz = residual.dot(search)
+        for i in range(self.max_iter):
+            if np.max(np.abs(residual)) < self.tol:
+                break
+            pushed = operate(search)
+            curvature = search.dot(pushed)
+            if curvature <= 0:
+                break
+            alpha = rz / curvature
+            step += alpha * search
+            residual -= alpha * pushed
+            z = precondition(residual)
+            rz, rz_old = residual.dot(z), rz
+            search = z + (rz / rz_old) * search
+        self.iterations = i
+        return split(step)
+
+
+if __name__ == '__main__':
+    print("settle.py is really meant to be called as a supporting module")
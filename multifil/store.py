@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+store.py - Array-backed storage for the mutable state of a lattice
+
+The half-sarcomere is built from thousands of small objects: thick and thin
+filaments, crowns, faces, cross-bridges, and binding sites. The state that
+changes as the model runs (cross-bridge states, which sites are bound to
+which cross-bridges, actin permissiveness, and the axial locations of the
+filament nodes) is kept here instead, in a few contiguous arrays owned by the
+half-sarcomere. The objects read and write through to these arrays, so whole
+lattice operations can work on the arrays directly.
+
+Cross-bridges and binding sites register with the store as they are created
+and are given an id, their index into the store's arrays. Until the lattice
+is fully built the arrays are plain lists, to which registration appends.
+Once the half-sarcomere has linked its filaments together it calls pack,
+which converts the lists into arrays and records the lattice's topology.
+
+Packed stores of the same topology, such as those of replicate
+half-sarcomeres, can be combined into one store so that they can be worked on
+together, see LatticeStore.combine.
+"""
+
+import numpy as np
+
+
+class LatticeStore:
+    """The state of a half-sarcomere, kept in arrays"""
+    def __init__(self):
+        """Create an empty store, ready for registration
+
+        Once packed, the store holds:
+            xb_state: int8 numeric state (0, 1, 2) of each cross-bridge
+            xb_bound: int32 id of the site each cross-bridge is bound to, -1
+                if unbound
+            site_bound: int32 id of the cross-bridge bound to each site, -1 if
+                unbound
+            permissiveness: the 0-1 binding permissiveness of each site
+            thick_axial: axial locations of thick filament crowns, by
+                (thick filament index, crown index)
+            thin_axial: axial locations of thin filament nodes, by (thin
+                filament index, node index)
+            crown_axial, site_axial: flat views of thick_axial and
+                thin_axial, the first indexed by xb_node and the second by
+                site id
+        and the topology arrays that relate them:
+            xb_node: flat index into thick_axial of each cross-bridge's crown
+            xb_orient: (y, z) vector along which each cross-bridge's radial
+                force acts on its crown, see mf.Crown
+            xb_face: index into face_sites of each cross-bridge's thin face
+            face_sites: site ids along each thin face, by (thin filament index
+                * 3 + face index, position on face)
+        Site ids are flat indices into thin_axial.
+        """
+        self.xbs = []
+        self.sites = []
+        self.xb_state = []
+        self.xb_bound = []
+        self.site_bound = []
+        self.permissiveness = []
+        self.thick_axial = []
+        self.thin_axial = []
+        self._face_search = None
+        self._parts = [] # stores combined into this one
+
+    def add_xb(self, xb):
+        """Register a cross-bridge, returning its id"""
+        self.xbs.append(xb)
+        self.xb_state.append(0)
+        self.xb_bound.append(-1)
+        return len(self.xbs) - 1
+
+    def add_site(self, site):
+        """Register a binding site, returning its id"""
+        self.sites.append(site)
+        self.site_bound.append(-1)
+        self.permissiveness.append(1.0)
+        return len(self.sites) - 1
+
+    def add_thick(self, axial):
+        """Register a thick filament's crown locations, returning its row"""
+        self.thick_axial.append(np.array(axial, dtype=float))
+        return len(self.thick_axial) - 1
+
+    def add_thin(self, axial):
+        """Register a thin filament's node locations, returning its row"""
+        self.thin_axial.append(np.array(axial, dtype=float))
+        return len(self.thin_axial) - 1
+
+    def pack(self):
+        """Convert the registered state to arrays and record the topology
+
+        To be called once all filaments are created and linked.
+        """
+        self.xb_state = np.array(self.xb_state, dtype=np.int8)
+        self.xb_bound = np.array(self.xb_bound, dtype=np.int32)
+        self.site_bound = np.array(self.site_bound, dtype=np.int32)
+        self.permissiveness = np.array(self.permissiveness, dtype=float)
+        self.thick_axial = np.vstack(self.thick_axial)
+        self.thin_axial = np.vstack(self.thin_axial)
+        # Flat views of the locations, indexed by xb_node and by site id
+        self.crown_axial = self.thick_axial.reshape(-1)
+        self.site_axial = self.thin_axial.reshape(-1)
+        # Sites were registered filament by filament, in node order, so a
+        # site's id is its flat index into thin_axial
+        assert all([site._id == np.ravel_multi_index(
+            (site.parent_thin.index, site.index), self.thin_axial.shape)
+            for site in self.sites]), "Site ids out of node order"
+        # Cross-bridge topology
+        n_crowns = self.thick_axial.shape[1]
+        self.xb_node = np.array([
+            xb.parent_face.parent_filament.index * n_crowns + xb.index
+            for xb in self.xbs])
+        self.xb_orient = np.zeros((len(self.xbs), 2))
+        for xb in self.xbs:
+            crown = xb.parent_face.parent_filament.crowns[xb.index]
+            slot = crown.crossbridges.index(xb)
+            self.xb_orient[xb._id] = crown.orientations[slot]
+        n_thin, n_nodes = self.thin_axial.shape
+        thins = [self.sites[i * n_nodes].parent_thin for i in range(n_thin)]
+        faces = [face for thin in thins for face in thin.thin_faces]
+        self.face_sites = np.array([[site._id for site in face.binding_sites]
+                                    for face in faces])
+        face_index = {face.address: i for i, face in enumerate(faces)}
+        self.xb_face = np.array([face_index[xb.thin_face.address]
+                                 for xb in self.xbs])
+
+    @classmethod
+    def combine(cls, stores):
+        """Join packed stores of the same topology into a single store
+
+        The combined store holds the state of each store in turn, so the
+        ids of the second store's cross-bridges follow on from those of the
+        first and so on. Each store's cross-bridge states, permissiveness,
+        and node locations become views into the combined arrays. Links
+        between cross-bridges and sites are held by combined id, so changes
+        to them are copied back to the stores by sync_links.
+
+        Parameters:
+            stores: packed stores sharing one topology
+        Returns:
+            combined: a packed store holding the state of all the stores
+        """
+        first = stores[0]
+        n_xb, n_site = len(first.xbs), len(first.sites)
+        n_crown, n_face = first.thick_axial.size, len(first.face_sites)
+        n_thick, n_thin = len(first.thick_axial), len(first.thin_axial)
+        combined = cls()
+        combined.xbs = [xb for st in stores for xb in st.xbs]
+        combined.sites = [site for st in stores for site in st.sites]
+        # State, with links renumbered by combined id
+        renumber = lambda links, n: np.concatenate([
+            np.where(link >= 0, link + i * n, -1)
+            for i, link in enumerate(links)]).astype(np.int32)
+        combined.xb_state = np.concatenate([st.xb_state for st in stores])
+        combined.xb_bound = renumber([st.xb_bound for st in stores], n_site)
+        combined.site_bound = renumber([st.site_bound for st in stores], n_xb)
+        combined.permissiveness = np.concatenate([st.permissiveness
+                                                  for st in stores])
+        combined.thick_axial = np.vstack([st.thick_axial for st in stores])
+        combined.thin_axial = np.vstack([st.thin_axial for st in stores])
+        combined.crown_axial = combined.thick_axial.reshape(-1)
+        combined.site_axial = combined.thin_axial.reshape(-1)
+        # Topology, repeated for each store
+        repeats = np.arange(len(stores))
+        combined.xb_node = (first.xb_node + n_crown * repeats[:, None]).ravel()
+        combined.xb_orient = np.tile(first.xb_orient, (len(stores), 1))
+        combined.face_sites = np.vstack([first.face_sites + i * n_site
+                                         for i in repeats])
+        combined.xb_face = (first.xb_face + n_face * repeats[:, None]).ravel()
+        # Point each store at its share of the combined state
+        for i, st in enumerate(stores):
+            st.xb_state = combined.xb_state[i * n_xb:(i + 1) * n_xb]
+            st.permissiveness = \
+                combined.permissiveness[i * n_site:(i + 1) * n_site]
+            st.thick_axial = \
+                combined.thick_axial[i * n_thick:(i + 1) * n_thick]
+            st.thin_axial = combined.thin_axial[i * n_thin:(i + 1) * n_thin]
+            st.crown_axial = st.thick_axial.reshape(-1)
+            st.site_axial = st.thin_axial.reshape(-1)
+            st.thin_moved()
+        combined._parts = list(stores)
+        return combined
+
+    def sync_links(self):
+        """Copy the links between cross-bridges and sites back to the
+        stores that were combined into this one"""
+        if len(self._parts) == 0:
+            return
+        n_xb, n_site = len(self._parts[0].xbs), len(self._parts[0].sites)
+        for i, st in enumerate(self._parts):
+            xb_bound = self.xb_bound[i * n_xb:(i + 1) * n_xb]
+            st.xb_bound[:] = np.where(xb_bound >= 0, xb_bound - i * n_site, -1)
+            site_bound = self.site_bound[i * n_site:(i + 1) * n_site]
+            st.site_bound[:] = np.where(site_bound >= 0,
+                                        site_bound - i * n_xb, -1)
+
+    def thin_moved(self):
+        """Note that the thin filament nodes have moved"""
+        self._face_search = None
+        for st in self._parts:
+            st.thin_moved()
+
+    def _face_keys(self):
+        """Site locations along every thin face, in one sorted array
+
+        Each face's locations are offset to lie past those of the face
+        before, so a location on a given face can be found among all faces
+        with one search, so long as it lies within (low, high). Kept until
+        the thin filaments move.
+        Returns:
+            (keys, offset, low, high): the offset site locations, flattened,
+                the offset between faces, and the span that locations
+                searched for must be clipped to
+        """
+        if self._face_search is None:
+            locs = self.site_axial[self.face_sites]
+            low, high = locs.min() - 1, locs.max() + 1
+            offset = high - low + 1
+            keys = locs + offset * np.arange(len(locs))[:, None]
+            self._face_search = (keys.ravel(), offset, low, high)
+        return self._face_search
+
+    def nearest_sites(self, faces, axial, hiding_line):
+        """The nearest binding site to each location, as af.ThinFace.nearest
+
+        Takes:
+            faces: index into face_sites of the thin face to search on
+            axial: axial location to find the nearest site to
+            hiding_line: locations below this are moved up to it
+        Returns:
+            site_ids: id of the nearest site on each face to each location
+        """
+        keys, offset, low, high = self._face_keys()
+        n_sites = self.face_sites.shape[1]
+        axial = np.clip(np.maximum(axial, hiding_line), low, high)
+        # Search every face at once, then find the place on each face
+        found = np.searchsorted(keys, axial + offset * faces)
+        next_index = found - faces * n_sites
+        prev_index = next_index - 1
+        # Past the end of a face the last site is nearest, otherwise the
+        # closer of the sites to either side, the next one if tied
+        at_end = next_index == n_sites
+        next_index[at_end] = n_sites - 1
+        prev_site = self.face_sites[faces, prev_index]
+        next_site = self.face_sites[faces, next_index]
+        prev_dist = np.abs(self.site_axial[prev_site] - axial)
+        next_dist = np.abs(self.site_axial[next_site] - axial)
+        return np.where(at_end | (prev_dist < next_dist), prev_site,
+                        next_site)
+
+    def bind(self, xb_ids, site_ids):
+        """Link cross-bridges to binding sites"""
+        self.xb_bound[xb_ids] = site_ids
+        self.site_bound[site_ids] = xb_ids
+
+    def unbind(self, xb_ids):
+        """Break the links between cross-bridges and their binding sites"""
+        self.site_bound[self.xb_bound[xb_ids]] = -1
+        self.xb_bound[xb_ids] = -1
+
+    def _state(self):
+        """The arrays holding the state that changes as the model runs,
+        leaving out site_bound, which follows from xb_bound. Those of the
+        first group change a few entries at a time, those of the second
+        change throughout at every step"""
+        return ((self.xb_state, self.xb_bound, self.permissiveness),
+                (self.thick_axial, self.thin_axial))
+
+    def to_bytes(self, since=None, offset=0):
+        """The contents of the state arrays, to be read by from_bytes
+
+        Takes:
+            since: bytes holding an earlier to_bytes of this store, if
+                given only the changes since then are written (None)
+            offset: where in since the earlier state starts (0)
+        Returns:
+            state: the state arrays' contents, or with since, the entries
+                of the first group of arrays that have changed and the
+                whole of the second
+        """
+        sparse, dense = self._state()
+        if since is None:
+            return b''.join([array.tobytes() for array in sparse + dense])
+        changes = []
+        for array in sparse:
+            before = np.frombuffer(since, array.dtype, array.size, offset)
+            offset += before.nbytes
+            changed = np.flatnonzero(array != before).astype(np.int32)
+            changes += [np.int32(changed.size).tobytes(), changed.tobytes(),
+                        array[changed].tobytes()]
+        return b''.join(changes + [array.tobytes() for array in dense])
+
+    def from_bytes(self, buf, offset=0, changes=False):
+        """Read state written by to_bytes, copying it into the arrays in
+        place so that any views of them see it
+
+        Takes:
+            buf: bytes holding the state of a store of the same topology
+            offset: where in buf the state starts (0)
+            changes: if the state was written as the changes since an
+                earlier state, which this store must hold (False)
+        Returns:
+            offset: where in buf the state ends
+        """
+        sparse, dense = self._state()
+        read = lambda dtype, n: np.frombuffer(buf, dtype, n, offset)
+        for array in sparse:
+            if not changes:
+                array[:] = read(array.dtype, array.size)
+                offset += array.nbytes
+                continue
+            n_changed = int(read(np.int32, 1)[0])
+            offset += 4
+            changed = read(np.int32, n_changed)
+            offset += changed.nbytes
+            array[changed] = read(array.dtype, n_changed)
+            offset += n_changed * array.itemsize
+        for array in dense:
+            array[...] = read(array.dtype, array.size).reshape(array.shape)
+            offset += array.nbytes
+        self.relink()
+        self.thin_moved()
+        return offset
+
+    def relink(self):
+        """Set the links from sites to follow those of the cross-bridges,
+        after xb_bound is written to directly"""
+        bound = np.flatnonzero(self.xb_bound >= 0)
+        self.site_bound[:] = -1
+        self.site_bound[self.xb_bound[bound]] = bound
+
+    def frac_in_states(self):
+        """Fraction of cross-bridges in each numeric state"""
+        counts = np.bincount(self.xb_state, minlength=3)
+        return counts / float(len(self.xb_state))
+
+
+if __name__ == '__main__':
+    print("store.py is really meant to be called as a supporting module")
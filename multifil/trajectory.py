@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+trajectory.py - Record a run's states compactly, to be read back at any step
+
+Writing the whole of hs.to_dict at each timestep makes for large files, yet
+only a few cross-bridges change state from one step to the next. A trajectory
+file instead holds a keyframe, a full hs.to_snapshot, every so many frames,
+and between them deltas of only what changed since the frame before: the
+cross-bridges whose state or binding changed, the sites whose permissiveness
+changed, and the node locations. An index of where each frame lies is
+written at the end, so a reader can rebuild the lattice at any frame by
+seeking to the keyframe before it and applying the deltas since.
+
+A trajectory file is laid out as:
+    MAGIC | header length, uint32 | header, the JSON hs.to_dict of the
+        sarcomere at the start of the trajectory
+    a record for each frame: RECORD_DTYPE | snapshot or delta
+    the index: INDEX_DTYPE for each record
+    the footer: FOOTER_DTYPE
+A file that was never closed has no index or footer, its records are read
+through in turn instead.
+"""
+
+import numpy as np
+import ujson as json
+from . import hs
+
+## Defaults
+MAGIC = b'MFTRAJ01'
+RECORD_DTYPE = np.dtype([('keyframe', 'u1'), ('timestep', '<i8'),
+                         ('length', '<u4')])
+INDEX_DTYPE = np.dtype([('keyframe', 'u1'), ('timestep', '<i8'),
+                        ('offset', '<i8')])
+FOOTER_DTYPE = np.dtype([('index_offset', '<i8'), ('frames', '<i8'),
+                         ('magic', 'S8')])
+KEYFRAME_EVERY = 100
+
+
+class TrajectoryWriter:
+    """Write a sarcomere's state at each step to a trajectory file"""
+    def __init__(self, filename, sarc, keyframe_every=None, offset=None):
+        """Open the file and write the header
+
+        Parameters:
+            filename: where to write the trajectory
+            sarc: the hs.hs to record
+            keyframe_every: frames from one keyframe to the next (100)
+            offset: to carry on an earlier trajectory of this sarcomere
+                instead, where in its file to continue from, as given by
+                offset() after the frame that sarc's state is now at
+        """
+        if keyframe_every is None:
+            keyframe_every = KEYFRAME_EVERY
+        self.sarc = sarc
+        self.keyframe_every = keyframe_every
+        if offset is None:
+            self.file = open(filename, 'wb')
+            write_header(self.file, sarc.to_dict())
+            self.index = []
+        else:
+            self.file = open(filename, 'r+b')
+            self.file.truncate(offset)
+            self.index = [tuple(entry) for entry in read_index(self.file)]
+            self.file.seek(offset)
+        # Deltas are of the frame written last, which a resumed writer
+        # hasn't got, so the first frame it writes is a keyframe
+        self.last_snapshot = None
+
+    def append(self):
+        """Add the sarcomere's current state, as a keyframe or a delta"""
+        keyframe = (self.last_snapshot is None or
+                    len(self.index) % self.keyframe_every == 0)
+        snapshot = self.sarc.to_snapshot()
+        if keyframe:
+            payload = snapshot
+        else:
+            payload = self.sarc.to_snapshot(since=self.last_snapshot)
+        self.last_snapshot = snapshot
+        self.index.append((keyframe, self.sarc.current_timestep,
+                           self.file.tell()))
+        record = np.array((keyframe, self.sarc.current_timestep,
+                           len(payload)), dtype=RECORD_DTYPE)
+        self.file.write(record.tobytes())
+        self.file.write(payload)
+
+    def offset(self):
+        """Bytes of the trajectory written so far, flushed to disk"""
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        """Write the index and footer and close the file"""
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        footer = np.array((index_offset, len(self.index), MAGIC),
+                          dtype=FOOTER_DTYPE)
+        self.file.write(footer.tobytes())
+        self.file.close()
+
+
+def write_header(tfile, sarc_dict):
+    """Write a trajectory's header, the sarcomere dict it starts from"""
+    header = json.dumps(sarc_dict, sort_keys=True).encode()
+    tfile.write(MAGIC)
+    tfile.write(np.uint32(len(header)).tobytes())
+    tfile.write(header)
+
+
+def read_header(tfile):
+    """Read a trajectory's header, leaving the file at the first record"""
+    tfile.seek(0)
+    if tfile.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a trajectory file")
+    length = int(np.frombuffer(tfile.read(4), np.uint32)[0])
+    return json.loads(tfile.read(length).decode())
+
+
+def read_index(tfile):
+    """Read a trajectory's index, from its end if it was closed, otherwise
+    by reading through its records up to the first incomplete one"""
+    tfile.seek(0, 2)
+    end = tfile.tell()
+    if end > FOOTER_DTYPE.itemsize:
+        tfile.seek(end - FOOTER_DTYPE.itemsize)
+        footer = np.frombuffer(tfile.read(FOOTER_DTYPE.itemsize),
+                               FOOTER_DTYPE)[0]
+        if footer['magic'] == MAGIC:
+            tfile.seek(footer['index_offset'])
+            size = int(footer['frames']) * INDEX_DTYPE.itemsize
+            return np.frombuffer(tfile.read(size), INDEX_DTYPE)
+    read_header(tfile)
+    index = []
+    while True:
+        offset = tfile.tell()
+        record = tfile.read(RECORD_DTYPE.itemsize)
+        if len(record) < RECORD_DTYPE.itemsize:
+            break
+        record = np.frombuffer(record, RECORD_DTYPE)[0]
+        if offset + RECORD_DTYPE.itemsize + record['length'] > end:
+            break
+        index.append((record['keyframe'], record['timestep'], offset))
+        tfile.seek(int(record['length']), 1)
+    return np.array(index, dtype=INDEX_DTYPE)
+
+
+class TrajectoryReader:
+    """Rebuild the sarcomere at any frame of a trajectory file"""
+    def __init__(self, filename):
+        """Open the trajectory and read its header and index
+
+        Parameters:
+            filename: the trajectory file to read
+        """
+        self.file = open(filename, 'rb')
+        # Building a lattice reseeds the random draws, which are the
+        # caller's, so they are left as they were
+        random_state = np.random.get_state()
+        self.sarc = hs.hs()
+        self.sarc.from_dict(read_header(self.file))
+        np.random.set_state(random_state)
+        self.index = read_index(self.file)
+        self.timesteps = self.index['timestep']
+        self._keyframes = np.flatnonzero(self.index['keyframe'])
+        self._loaded = None # frame the sarc is at
+
+    def __len__(self):
+        """Number of frames in the trajectory"""
+        return len(self.index)
+
+    def _payload(self, frame):
+        """The snapshot or delta recorded for a frame"""
+        self.file.seek(int(self.index[frame]['offset']))
+        record = np.frombuffer(self.file.read(RECORD_DTYPE.itemsize),
+                               RECORD_DTYPE)[0]
+        return self.file.read(int(record['length']))
+
+    def load(self, frame):
+        """The sarcomere as it was at a frame
+
+        Parameters:
+            frame: index of the frame, 0 to len(self) - 1
+        Returns:
+            sarc: the reader's hs.hs, with its state set to that of the
+                frame; it is reused by the next load, so read what is
+                needed from it or copy it with to_snapshot first
+        """
+        if frame < 0:
+            frame += len(self)
+        keyframe = self._keyframes[np.searchsorted(self._keyframes, frame,
+                                                   'right') - 1]
+        # Carry on from the frame loaded last if that is closer
+        if self._loaded is not None and keyframe <= self._loaded <= frame:
+            start = self._loaded + 1
+        else:
+            self.sarc.from_snapshot(self._payload(keyframe))
+            start = keyframe + 1
+        for i in range(start, frame + 1):
+            self.sarc.from_snapshot(self._payload(i))
+        self._loaded = frame
+        return self.sarc
+
+    def __iter__(self):
+        """Each frame's sarcomere in turn, see load"""
+        for frame in range(len(self)):
+            yield self.load(frame)
+
+    def close(self):
+        """Close the trajectory file"""
+        self.file.close()
+
+
+if __name__ == '__main__':
+    print("trajectory.py is really meant to be called as a supporting module")
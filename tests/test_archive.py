@@ -0,0 +1,77 @@
+"""Reading JSON sarc files a timestep at a time with archive.SarcJsonReader"""
+
+import os
+import gzip
+import lzma
+import numpy as np
+import ujson as json
+import pytest
+from multifil import hs, archive
+
+OPENERS = {'.gz': gzip.open, '.xz': lzma.open, '': open}
+
+
+def _record(working_dir, steps=6, suffix='.gz'):
+    """Write a JSON sarc file of a seeded run, a sarcomere dict a line, as
+    run.sarc_file does, returning its name and the dict and snapshot of
+    each frame written"""
+    filename = os.path.join(working_dir, 'sarc.sarc.json' + suffix)
+    sarc = hs.hs(seed=1)
+    dicts, snapshots = [], []
+    with OPENERS[suffix](filename, 'wb') as sarc_file:
+        sarc_file.write(b'[\n')
+        for i in range(steps + 1):
+            if i > 0:
+                sarc.timestep()
+                sarc_file.write(b',\n')
+            encoded = json.dumps(sarc.to_dict(), sort_keys=True)
+            sarc_file.write(encoded.encode())
+            dicts.append(json.loads(encoded))
+            snapshots.append(sarc.to_snapshot())
+        sarc_file.write(b'\n]')
+    return filename, dicts, snapshots
+
+
+@pytest.mark.parametrize('suffix', ['', '.gz', '.xz'])
+def test_random_access(tmp_path, suffix):
+    filename, dicts, snapshots = _record(str(tmp_path), suffix=suffix)
+    reader = archive.SarcJsonReader(filename)
+    assert len(reader) == len(dicts)
+    assert list(reader.timesteps) == [sd['current_timestep'] for sd in dicts]
+    assert list(reader) == dicts
+    for frame in (4, 0, 6, 5, 2):
+        assert reader.read(frame) == dicts[frame]
+        assert reader.load(frame).to_snapshot() == snapshots[frame]
+    assert reader.frame_of(3) == 3
+    with pytest.raises(KeyError):
+        reader.frame_of(99)
+
+
+def test_index_kept(tmp_path, monkeypatch):
+    filename, dicts, snapshots = _record(str(tmp_path))
+    first = archive.SarcJsonReader(filename)
+    assert os.path.exists(filename + archive.INDEX_SUFFIX)
+    # A second reader takes the index kept beside the file, unless the
+    # file has changed since
+    builds = []
+    build = archive.SarcJsonReader._build_index
+    monkeypatch.setattr(archive.SarcJsonReader, '_build_index',
+                        lambda reader: builds.append(1) or build(reader))
+    second = archive.SarcJsonReader(filename)
+    assert builds == []
+    assert np.array_equal(second.index, first.index)
+    assert second.read(5) == dicts[5]
+    os.utime(filename, ns=(0, 0))
+    archive.SarcJsonReader(filename)
+    assert builds == [1]
+
+
+def test_load_leaves_random_state(tmp_path):
+    filename, dicts, snapshots = _record(str(tmp_path))
+    reader = archive.SarcJsonReader(filename)
+    np.random.seed(5)
+    expected = np.random.rand(3)
+    np.random.seed(5)
+    reader.load(3)
+    reader.load(1)
+    assert np.array_equal(np.random.rand(3), expected)
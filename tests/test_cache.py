@@ -0,0 +1,88 @@
+"""Reuse of finished runs' outputs by cache.run_cache"""
+
+import os
+import pytest
+import ujson as json
+from multifil import hs
+from multifil.aws import metas, run, cache
+
+
+def _meta(**kwargs):
+    """A seeded meta dict, not written to disk"""
+    kwargs.setdefault('seed', 1)
+    return metas.emit('./', None, metas.time(0.5, 3), write=False, **kwargs)
+
+
+def _store(store, meta, directory, size=100):
+    """Cache an output file of size bytes for a meta, returning its entry"""
+    fn = os.path.join(str(directory), meta['name'] + '.sarc.json.gz')
+    with open(fn, 'wb') as outfile:
+        outfile.write(b'x' * size)
+    store.store(meta, [fn])
+    return os.path.join(store.directory, str(store.key(meta)))
+
+
+def _outputs(metafile):
+    """The data and sarc files of a finished run, less the run's name"""
+    name = metafile.replace('.meta.json', '')
+    with open(name + '.data.json', 'r') as datafile:
+        data = json.load(datafile)
+    data.pop('name')
+    with open(name + '.sarc.json.gz', 'rb') as sarcfile:
+        sarc = sarcfile.read()
+    return data, sarc
+
+
+def test_hit(tmp_path, monkeypatch):
+    kwargs = {'seed': 1, 'cache': str(tmp_path / 'cache')}
+    first, second = [metas.emit(str(tmp_path), None, metas.time(0.5, 3),
+                                **kwargs) for i in range(2)]
+    run.manage(os.path.join(str(tmp_path), first['name'] + '.meta.json'),
+               unattended=False).run_and_save()
+    # The second run is copied from the cache rather than simulated
+    def timestep(self, current=None):
+        raise AssertionError("cached run was simulated")
+    monkeypatch.setattr(hs.hs, 'timestep', timestep)
+    metafiles = [os.path.join(str(tmp_path), meta['name'] + '.meta.json')
+                 for meta in (first, second)]
+    run.manage(metafiles[1], unattended=False).run_and_save()
+    assert _outputs(metafiles[1]) == _outputs(metafiles[0])
+
+
+@pytest.mark.parametrize('field', cache.KEYED_FIELDS)
+def test_keyed_field_misses(tmp_path, field):
+    store = cache.run_cache(str(tmp_path / 'cache'))
+    meta = _meta()
+    _store(store, meta, tmp_path)
+    assert store.fetch(_meta(), str(tmp_path)) is not None
+    changed = _meta()
+    changed[field] = 'changed'
+    assert store.fetch(changed, str(tmp_path)) is None
+
+
+def test_version_misses(tmp_path, monkeypatch):
+    store = cache.run_cache(str(tmp_path / 'cache'))
+    _store(store, _meta(), tmp_path)
+    monkeypatch.setattr(cache, 'CACHE_VERSION', cache.CACHE_VERSION + 1)
+    assert store.fetch(_meta(), str(tmp_path)) is None
+
+
+def test_unseeded_not_cached(tmp_path):
+    store = cache.run_cache(str(tmp_path / 'cache'))
+    _store(store, _meta(seed=None), tmp_path)
+    assert os.listdir(store.directory) == []
+
+
+def test_least_recently_used_evicted(tmp_path):
+    store = cache.run_cache(str(tmp_path / 'cache'), max_bytes=250)
+    old, older, new = _meta(seed=1), _meta(seed=2), _meta(seed=3)
+    for age, meta in ((200, older), (100, old)):
+        entry = _store(store, meta, tmp_path)
+        used = os.path.getmtime(entry) - age
+        os.utime(entry, (used, used))
+    # Using the older entry makes the other the least recently used
+    assert store.fetch(older, str(tmp_path)) is not None
+    _store(store, new, tmp_path)
+    assert store.fetch(old, str(tmp_path)) is None
+    assert store.fetch(older, str(tmp_path)) is not None
+    assert store.fetch(new, str(tmp_path)) is not None
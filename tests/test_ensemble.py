@@ -0,0 +1,42 @@
+"""Replicates run in lockstep by ensemble.Ensemble against lone sarcomeres"""
+
+import numpy as np
+import pytest
+from multifil import hs, ensemble
+
+
+@pytest.mark.parametrize('method', ['relax', 'direct', 'newton'])
+def test_one_replicate_matches_hs(method):
+    ens = ensemble.Ensemble(1, seed=1, settle_method=method)
+    ens_out = ens.run(5, callback=lambda sarc: sarc.to_snapshot(), bar=False)
+    sarc = hs.hs(seed=1, settle_method=method)
+    out = sarc.run(5, callback=lambda sarc: sarc.to_snapshot(), bar=False)
+    assert ens_out == [out]
+    assert ens.replicates[0].last_transitions == sarc.last_transitions
+
+
+def test_per_replicate_results():
+    ens = ensemble.Ensemble(3, seed=1)
+    for i in range(5):
+        ens.timestep()
+    reps = ens.replicates
+    n_xb, n_site = len(reps[0].store.xbs), len(reps[0].store.sites)
+    assert ens.xb_state.shape == (3, n_xb)
+    assert ens.permissiveness.shape == (3, n_site)
+    assert ens.thick_axial.shape == (3,) + reps[0].store.thick_axial.shape
+    assert ens.thin_axial.shape == (3,) + reps[0].store.thin_axial.shape
+    for i, rep in enumerate(reps):
+        assert np.shares_memory(ens.thick_axial[i], rep.store.thick_axial)
+        assert np.array_equal(ens.xb_state[i], rep.store.xb_state)
+    assert np.allclose(ens.axialforce(), [rep.axialforce() for rep in reps])
+    assert np.allclose(ens.radialtension(),
+                       [rep.radialtension() for rep in reps])
+    assert np.allclose(ens.radialforce(), [rep.radialforce() for rep in reps])
+    assert np.allclose(ens.get_frac_in_states(),
+                       [rep.get_frac_in_states() for rep in reps])
+
+
+def test_no_single_lattice_methods():
+    ens = ensemble.Ensemble(2, seed=1)
+    for name in ('from_dict', 'restore', 'clone', 'to_snapshot'):
+        assert not hasattr(ens, name)
@@ -0,0 +1,80 @@
+"""Expected binding against Monte Carlo over diffused head tips"""
+
+import numpy as np
+import pytest
+from multifil import heads
+
+SEPARATIONS = np.array([6.0, 8.0, 10.0, 12.0, 14.0])
+DRAWS = 100000
+
+
+@pytest.fixture(scope='module')
+def pair():
+    """Heads drawing tips, and heads with an ExpectedBinding attached"""
+    stochastic = heads.Heads()
+    expected = heads.Heads()
+    expected.expected = heads.ExpectedBinding(expected, 1.0)
+    return stochastic, expected
+
+
+def _monte_carlo(prob, y):
+    """Mean over DRAWS tips at each separation of prob(x, y)"""
+    np.random.seed(0)
+    x = np.repeat(SEPARATIONS, DRAWS)
+    return prob(x, np.full(x.shape, y)).reshape(len(SEPARATIONS), -1).mean(1)
+
+
+@pytest.mark.parametrize('y', [12.0, 14.0, 16.0])
+def test_bind_prob(pair, y):
+    stochastic, expected = pair
+    reference = _monte_carlo(
+        lambda x, y: stochastic.bind_prob(x, y, 1.0), y)
+    found = expected.bind_prob(SEPARATIONS, y, 1.0)
+    assert np.allclose(found, reference, rtol=0.05, atol=5e-4)
+
+
+@pytest.mark.parametrize('y', [12.0, 14.0, 16.0])
+def test_r21_prob(pair, y):
+    stochastic, expected = pair
+    reference = _monte_carlo(
+        lambda x, y: stochastic.r21_prob(x, y, 1.0), y)
+    found = expected.r21_prob(SEPARATIONS, y, 1.0)
+    assert np.allclose(found, reference, rtol=0.05, atol=5e-4)
+
+
+def test_other_timestep(pair):
+    with pytest.raises(ValueError):
+        pair[1].bind_prob(SEPARATIONS, 14.0, 0.5)
+
+
+def test_rate_table_within_error():
+    heads_ = heads.Heads()
+    table = heads.RateTable(heads_)
+    x = np.linspace(-30, 30, 1001)
+    for y in np.linspace(12.0, 16.0, 37):
+        found = table.lookup(table.QUANTITIES, x, y)
+        direct = table._evaluate(x, y)
+        for name, values in zip(table.QUANTITIES, found):
+            assert np.abs(values - direct[name]).max() <= table.error[name]
+
+
+def test_rate_table_keeps_rows():
+    table = heads.RateTable(heads.Heads())
+    spacings = 14.0 + 0.3 * np.sin(np.linspace(0, 20, 200))
+    for y in spacings:
+        table.lookup('loose', np.zeros(3), y)
+    assert table.builds == len(table.rows)
+    assert table.builds <= np.ptp(spacings) / table.y_step + 2
+
+
+def test_expected_between_rows(pair):
+    stochastic, expected = pair
+    table = expected.expected
+    for y in (12.01, 13.333, 15.97):
+        found = expected.bind_prob(SEPARATIONS, y, 1.0)
+        direct = np.interp(SEPARATIONS, table.x, table._tabulate(y)['bind'])
+        assert np.allclose(found, direct, atol=2e-3)
+    builds = table.builds
+    for y in 14.0 + 0.02 * np.sin(np.linspace(0, 20, 50)):
+        expected.bind_prob(SEPARATIONS, y, 1.0)
+    assert table.builds - builds <= 2
@@ -0,0 +1,47 @@
+"""Batch kinetics against the object kinetics they stand in for"""
+
+import collections
+import numpy as np
+import pytest
+from multifil import hs
+
+CODES = ('12', '21', '23', '32', '31')
+
+
+def _transition_counts(sarc, transition, reps=100):
+    """Count each transition over many single steps of kinetics, all taken
+    from the sarcomere's current state"""
+    snapshot = sarc.to_snapshot()
+    counts = collections.Counter()
+    np.random.seed(2)
+    for i in range(reps):
+        sarc.from_snapshot(snapshot)
+        counts.update(t for thick in transition() for crown in thick
+                      for t in crown)
+    sarc.from_snapshot(snapshot)
+    return counts
+
+
+def test_same_transitions_from_one_state():
+    sarc = hs.hs(seed=1)
+    for i in range(20):
+        sarc.timestep()
+    batch = _transition_counts(sarc, sarc._batch_transition)
+    objects = _transition_counts(
+        sarc, lambda: [thick.transition() for thick in sarc.thick])
+    for code in CODES:
+        # Counts of rare events, so a difference within five sigma
+        both = batch[code] + objects[code]
+        assert both > 0
+        assert abs(batch[code] - objects[code]) <= 5 * np.sqrt(both)
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_same_state_fractions(seed):
+    found = {}
+    for kinetics in ('batch', 'object'):
+        sarc = hs.hs(seed=seed, kinetics=kinetics)
+        fracs = sarc.run(30, callback=lambda sarc: sarc.get_frac_in_states(),
+                         bar=False)
+        found[kinetics] = np.mean(fracs[10:], axis=0)
+    assert np.allclose(found['batch'], found['object'], atol=0.03)
@@ -0,0 +1,122 @@
+"""Metrics recorded of a run, and the timesteps they are recorded at"""
+
+import types
+import numpy as np
+import ujson as json
+import pytest
+from multifil import hs
+from multifil.aws import metrics
+
+
+def _baseline(sarc):
+    """The row the data file recorded before there were metrics"""
+    radial_force = sarc.radialforce()
+    xb_fracs = sarc.get_frac_in_states()
+    xb_trans = sum(sum(sarc.last_transitions, []), [])
+    thick_d = np.hstack([t.displacement_per_crown() for t in sarc.thick])
+    thin_d = np.hstack([t.displacement_per_node() for t in sarc.thin])
+    row = {
+        'timestep': sarc.current_timestep,
+        'z_line': sarc.z_line,
+        'lattice_spacing': sarc.lattice_spacing,
+        'axial_force': sarc.axialforce(),
+        'radial_force_y': radial_force[0],
+        'radial_force_z': radial_force[1],
+        'radial_tension': sarc.radialtension(),
+        'xb_fraction_free': xb_fracs[0],
+        'xb_fraction_loose': xb_fracs[1],
+        'xb_fraction_tight': xb_fracs[2],
+        'actin_permissiveness': np.mean(sarc.actin_permissiveness),
+    }
+    for trans in ('12', '23', '31', '21', '32', '13'):
+        row['xb_trans_' + trans] = xb_trans.count(trans)
+    row['xb_trans_static'] = xb_trans.count(None)
+    for name, displace in (('thick', thick_d), ('thin', thin_d)):
+        row[name + '_displace_mean'] = np.mean(displace)
+        row[name + '_displace_max'] = np.max(displace)
+        row[name + '_displace_min'] = np.min(displace)
+        row[name + '_displace_std'] = np.std(displace)
+    return row
+
+
+def test_default_matches_baseline():
+    sarc = hs.hs(seed=1)
+    recorder = metrics.recorder.from_meta(sarc, {})
+    for i in range(5):
+        sarc.timestep()
+        assert recorder.due()
+        row = recorder.record()
+        baseline = _baseline(sarc)
+        # The one column added since is the rejected bindings
+        assert set(row) - set(baseline) == {'bind_rejection_rate'}
+        for name, value in baseline.items():
+            assert row[name] == pytest.approx(value, rel=1e-9, abs=1e-12)
+
+
+def test_subset(monkeypatch):
+    sarc = hs.hs(seed=1)
+    sarc.timestep()
+    # Nothing is found that the metrics asked for don't need
+    def radialforce(self, forces=None):
+        raise AssertionError("radial force found but not asked for")
+    monkeypatch.setattr(hs.hs, 'radialforce', radialforce)
+    recorder = metrics.recorder.from_meta(
+        sarc, {'metrics': ['axial_force', 'timestep']})
+    assert recorder.columns == [('timestep', 'i8'), ('axial_force', 'f8')]
+    assert recorder.due()
+    assert list(recorder.record()) == ['timestep', 'axial_force']
+
+
+def _dues(policy, values=None, steps=8, start=0):
+    """Which of a run's timesteps a policy records, as a stand-in sarc
+    takes them with its 'axial_force' going through values"""
+    sarc = types.SimpleNamespace(timestep_len=0.5)
+    dues = []
+    for timestep in range(start, steps):
+        sarc.current_timestep = timestep
+        value = None if values is None else values[timestep]
+        dues.append(policy.due(sarc, lambda name: value))
+    return dues
+
+
+def test_policy_every():
+    policy = metrics.record_policy(every=3)
+    assert _dues(policy) == [True, False, False, True, False, False, True,
+                             False]
+    assert policy.most_rows(8, 0.5) == 3
+
+
+def test_policy_windows():
+    # Times in ms, from start up to but not including stop
+    policy = metrics.record_policy(windows=[[0.5, 1.5], [3, 10]])
+    assert _dues(policy) == [False, True, True, False, False, False, True,
+                             True]
+    assert policy.most_rows(8, 0.5) == 4
+
+
+def test_policy_trigger():
+    # Nothing is scheduled, so only the timesteps captured are recorded
+    policy = metrics.record_policy(windows=[], trigger={
+        'metric': 'axial_force', 'value': 2.5, 'steps': 2})
+    values = [0, 5, 5, 5, 5, 0, 1, None]
+    assert _dues(policy, values) == [False, True, True, False, False, True,
+                                     True, False]
+    assert policy.most_rows(8, 0.5) == 8
+    with pytest.raises(KeyError):
+        metrics.record_policy(trigger={'metric': 'bogus', 'value': 0})
+
+
+def test_policy_set_state():
+    trigger = {'metric': 'axial_force', 'value': 2.5, 'steps': 3}
+    values = [0, 1, 5, 5, 5, 5, 0, 0]
+    straight = _dues(metrics.record_policy(every=4, trigger=trigger),
+                     values)
+    first = metrics.record_policy(every=4, trigger=trigger)
+    dues = _dues(first, values, steps=3)
+    # Carried on from its state, as a checkpoint keeps it
+    state = json.loads(json.dumps(first.state()))
+    resumed = metrics.record_policy(every=4, trigger=trigger)
+    resumed.set_state(state)
+    dues += _dues(resumed, values, start=3)
+    assert dues == straight
+    assert straight == [True, False, True, True, True, False, True, True]
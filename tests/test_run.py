@@ -0,0 +1,278 @@
+"""Runs managed by run.manage, locally and from their meta files"""
+
+import os
+import types
+import shutil
+import ujson as json
+import pytest
+from multifil import hs, archive, trajectory
+from multifil.aws import metas, run, local, columns
+
+
+def _emit(directory, steps=6, path_s3=None, **kwargs):
+    """Write the meta file of a short seeded run, returning its name"""
+    kwargs.setdefault('seed', 1)
+    rund = metas.emit(str(directory), path_s3, metas.time(0.5, steps * 0.5),
+                      **kwargs)
+    return os.path.join(str(directory), rund['name'] + '.meta.json')
+
+
+def _output(metafile, suffix):
+    """The output of a finished run, as named by its meta file"""
+    return metafile.replace('.meta.json', suffix)
+
+
+def _data(metafile):
+    """The JSON data file of a finished run, less its name"""
+    with open(_output(metafile, '.data.json'), 'r') as datafile:
+        data = json.load(datafile)
+    data.pop('name')
+    return data
+
+
+def _manage(metafile, stop=None):
+    """Run a meta file through a manager, up to stop if given"""
+    manager = run.manage(metafile, unattended=False)
+    manager.run_and_save(stop)
+    return manager
+
+
+def _columns(metafile):
+    """The column data file of a finished run as its JSON data file would
+    have it, NaNs written for missing values read back as None"""
+    data = columns.read_columns(_output(metafile, '.data.cols'))
+    data.pop('name')
+    for name, value in data.items():
+        if hasattr(value, 'tolist'):
+            data[name] = [None if row != row else row
+                          for row in value.tolist()]
+    return data
+
+
+def _outputs(metafile):
+    """The data and sarc frames of a finished run, less what differs
+    between runs of the same meta: the name and time spent settling"""
+    meta = run.manage.unpack_meta(metafile)
+    if meta.get('data_format') == 'columns':
+        data = _columns(metafile)
+    else:
+        data = _data(metafile)
+    if meta.get('sarc_format') == 'trajectory':
+        reader = trajectory.TrajectoryReader(_output(metafile, '.sarc.traj'))
+        frames = [sarc.to_dict() for sarc in reader]
+    else:
+        reader = archive.SarcJsonReader(_output(metafile, '.sarc.json.gz'))
+        frames = list(reader)
+    reader.close()
+    for frame in frames:
+        if frame['last_settle'] is not None:
+            frame['last_settle'].pop('time')
+    return data, frames
+
+
+RESUMED = [
+    {},
+    {'data_format': 'columns'},
+    {'sarc_format': 'trajectory', 'keyframe_every': 5},
+    # The frame written last is before the checkpoint
+    {'sarc_format': 'trajectory', 'sarc_policy': {'every': 5}},
+    {'sarc_writer': 'background'},
+    {'data_policy': {'every': 3}, 'sarc_policy': {'windows': [[2, 6]]}},
+]
+
+
+@pytest.mark.parametrize('config', RESUMED)
+def test_resume(tmp_path, config):
+    straight = _emit(tmp_path, 20, **config)
+    _manage(straight)
+    resumed = _emit(tmp_path, 20, **config)
+    _manage(resumed, stop=13)
+    _manage(resumed)
+    assert _outputs(resumed) == _outputs(straight)
+
+
+def test_columns_match_json(tmp_path, monkeypatch):
+    json_run = _emit(tmp_path, 20)
+    _manage(json_run)
+    columns_run = _emit(tmp_path, 20, data_format='columns')
+    _manage(columns_run)
+    assert _columns(columns_run) == _data(json_run)
+    # A run that dies after its last checkpoint has written rows past it,
+    # which the resumed run writes over
+    timestep = hs.hs.timestep
+    def dies(sarc, current=None):
+        if current == 13:
+            raise RuntimeError("instance reclaimed")
+        return timestep(sarc, current)
+    resumed = _emit(tmp_path, 20, data_format='columns', checkpoint_every=5)
+    monkeypatch.setattr(hs.hs, 'timestep', dies)
+    with pytest.raises(RuntimeError):
+        _manage(resumed)
+    monkeypatch.setattr(hs.hs, 'timestep', timestep)
+    manager = run.manage(resumed, unattended=False)
+    assert manager._load_checkpoint()['timestep'] == 9
+    manager.run_and_save()
+    assert _columns(resumed) == _data(json_run)
+
+
+@pytest.mark.parametrize('data_format', [None, 'columns'])
+def test_metrics_subset(tmp_path, data_format):
+    metafile = _emit(tmp_path, metrics=['axial_force', 'timestep'],
+                     data_format=data_format)
+    _manage(metafile)
+    data = _outputs(metafile)[0]
+    assert sorted(data) == ['axial_force', 'timestep', 'timestep_length']
+    assert data['timestep'] == list(range(6))
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'xz'])
+def test_background_writer_same_bytes(tmp_path, monkeypatch, compression):
+    # Settles take the same time, as the time is written with each frame
+    monkeypatch.setattr(hs, 'time', types.SimpleNamespace(time=lambda: 0.))
+    suffix = run.SARC_COMPRESSORS[compression][0]
+    sarcs = []
+    for writer in (None, 'background'):
+        metafile = _emit(tmp_path, sarc_writer=writer,
+                         sarc_compression=compression, checkpoint_every=4)
+        _manage(metafile)
+        with open(_output(metafile, '.sarc.json' + suffix), 'rb') as sarc:
+            sarcs.append(sarc.read())
+    assert sarcs[0] == sarcs[1]
+
+
+def test_background_writer_error(tmp_path, monkeypatch):
+    def write(sarcfile, capture):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(run.sarc_file, '_write_capture', write)
+    manager = run.manage(_emit(tmp_path, sarc_writer='background'),
+                         unattended=False)
+    with pytest.raises(OSError, match="No space left"):
+        manager.run_and_save()
+
+
+def _sarc_frames(filename):
+    """Every frame of a JSON sarc file, read through archive"""
+    reader = archive.SarcJsonReader(filename)
+    frames = [reader.read(frame) for frame in range(len(reader))]
+    assert list(reader) == frames
+    reader.close()
+    return frames
+
+
+def test_compressed_sarc_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(hs, 'time', types.SimpleNamespace(time=lambda: 0.))
+    # Read as written, uncompressed
+    plain = str(tmp_path / 'plain.sarc.json')
+    frames = {}
+    for compression in run.SARC_COMPRESSORS:
+        suffix = run.SARC_COMPRESSORS[compression][0]
+        straight = _emit(tmp_path, 20, sarc_compression=compression)
+        _manage(straight)
+        sarc_name = _output(straight, '.sarc.json' + suffix)
+        with archive.open_sarc_json(sarc_name) as sarc:
+            decompressed = sarc.read()
+        with open(plain, 'wb') as sarc:
+            sarc.write(decompressed)
+        frames[compression] = _sarc_frames(sarc_name)
+        assert frames[compression] == _sarc_frames(plain)
+        assert frames[compression] == json.loads(decompressed)
+        assert len(frames[compression]) == 21
+        os.remove(plain + archive.INDEX_SUFFIX)
+        # Resumed, each checkpoint starts a stream of its own
+        resumed = _emit(tmp_path, 20, sarc_compression=compression,
+                        checkpoint_every=4)
+        _manage(resumed, stop=13)
+        _manage(resumed)
+        assert _sarc_frames(_output(resumed, '.sarc.json' + suffix)) == \
+                frames[compression]
+    assert frames['gzip'] == frames['xz']
+
+
+class _local_s3:
+    """Stands in for run.s3, keeping keys as files under a directory"""
+    root = None
+
+    def _path(self, name):
+        return os.path.join(self.root, name.replace('s3://', '').strip('/'))
+
+    def exists_on_s3(self, name):
+        return os.path.exists(self._path(name))
+
+    def delete_from_s3(self, name):
+        if os.path.exists(self._path(name)):
+            os.remove(self._path(name))
+
+    def pull_from_s3(self, name, local='./'):
+        os.makedirs(local, exist_ok=True)
+        downloaded_name = local + '/' + os.path.basename(name)
+        shutil.copyfile(self._path(name), downloaded_name)
+        return downloaded_name
+
+    def push_to_s3(self, local, remote):
+        os.makedirs(self._path(remote), exist_ok=True)
+        shutil.copyfile(local, self._path(remote) + '/' +
+                        os.path.basename(local))
+
+
+@pytest.mark.parametrize('config', RESUMED[:3])
+def test_resume_from_s3(tmp_path, monkeypatch, config):
+    monkeypatch.setattr(_local_s3, 'root', str(tmp_path / 's3'))
+    monkeypatch.setattr(run, 's3', _local_s3)
+    straight = _emit(tmp_path, 20, **config)
+    _manage(straight)
+    resumed = _emit(tmp_path, 20, path_s3='s3://bucket/runs', **config)
+    manager = _manage(resumed, stop=13)
+    # Carry on as if on another instance, with only what is on S3
+    shutil.rmtree(manager.working_dir)
+    remote = tmp_path / 's3' / 'bucket' / 'runs' / 'checkpoints'
+    assert len(os.listdir(str(remote))) == len(manager._checkpoint_files())
+    manager = run.manage(resumed, unattended=False)
+    assert os.path.exists(manager.checkpoint_filename)
+    manager.run_and_save()
+    assert _outputs(resumed) == _outputs(straight)
+    assert os.listdir(str(remote)) == []
+
+
+def test_branches(tmp_path):
+    # Alike for the 8 timesteps branched from, then apart
+    traces = [[1250.] * 16, [1250.] * 8 + [1255.] * 8]
+    kwargs = {'data_format': 'columns', 'cache': str(tmp_path / 'cache')}
+    branched = [_emit(tmp_path, 16, z_line=trace, **kwargs)
+                for trace in traces]
+    summary = local.run_branches(branched, 8, report=None)
+    assert [job['status'] for job in summary] == ['done', 'done']
+    for metafile, trace in zip(branched, traces):
+        straight = _emit(tmp_path, 16, z_line=trace,
+                         data_format='columns')
+        _manage(straight)
+        assert _outputs(metafile) == _outputs(straight)
+    # Branches found in the cache leave nothing behind
+    cached = [_emit(tmp_path, 16, z_line=trace, **kwargs)
+              for trace in traces]
+    summary = local.run_branches(cached, 8, report=None)
+    assert [job['status'] for job in summary] == ['done', 'done']
+    for metafile in cached:
+        name = os.path.basename(metafile).split('.')[0]
+        assert os.listdir('/tmp/' + name) == [name + '.meta.json']
+        assert _outputs(metafile) == _outputs(branched[cached.index(
+            metafile)])
+
+
+def test_sweep(tmp_path):
+    good = [_emit(tmp_path) for i in range(2)]
+    bad = _emit(tmp_path, settle_method='bogus')
+    summary = local.run_sweep(good + [bad], processes=2, report=None)
+    assert [job['status'] for job in summary] == ['done', 'done', 'failed']
+    assert [job['attempts'] for job in summary] == [1, 1, 2]
+    assert 'Unknown settle_method' in summary[2]['error']
+    # Seeded runs come out the same in any process
+    assert _data(good[0]) == _data(good[1])
+
+
+def test_sweep_worker_dies(tmp_path, monkeypatch):
+    # Worker processes are forked, so they inherit the patch
+    monkeypatch.setattr(run.manage, 'run_and_save',
+                        lambda manager: os._exit(3))
+    summary = local.run_sweep([_emit(tmp_path)], retries=0, report=None)
+    assert summary[0]['status'] == 'failed'
+    assert 'exited with code 3' in summary[0]['error']
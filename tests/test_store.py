@@ -0,0 +1,102 @@
+"""The array-backed lattice state of store.LatticeStore and its views"""
+
+import numpy as np
+import pytest
+from multifil import hs
+
+
+@pytest.fixture(params=['batch', 'object'])
+def sarc(request):
+    """A sarcomere run long enough for cross-bridges to bind and unbind"""
+    sarc = hs.hs(seed=1, kinetics=request.param)
+    for i in range(10):
+        sarc.timestep()
+    return sarc
+
+
+def _check_links(sarc):
+    """The object graph and the store agree on every binding"""
+    st = sarc.store
+    for xb in st.xbs:
+        site = xb.bound_to
+        assert xb.numeric_state == st.xb_state[xb._id]
+        assert (site is None) == (st.xb_bound[xb._id] < 0)
+        assert (site is None) == (xb.numeric_state == 0)
+        if site is not None:
+            assert site._id == st.xb_bound[xb._id]
+            assert site.bound_to is xb
+    for site in st.sites:
+        xb = site.bound_to
+        assert (xb is None) == (st.site_bound[site._id] < 0)
+        if xb is not None:
+            assert xb.bound_to is site
+
+
+def test_links_after_run(sarc):
+    assert np.any(sarc.store.xb_bound >= 0)
+    _check_links(sarc)
+
+
+def test_links_after_bind_and_unbind(sarc):
+    st = sarc.store
+    # Bind a free cross-bridge through the store, unbind a bound one
+    free = np.flatnonzero(st.xb_bound < 0)[0]
+    site = st.xbs[free].thin_face.nearest(st.xbs[free].axial_location)
+    st.xb_state[free] = 1
+    st.bind([free], [site._id])
+    bound = np.flatnonzero(st.xb_bound >= 0)
+    bound = bound[bound != free][0]
+    st.xb_state[bound] = 0
+    st.unbind([bound])
+    _check_links(sarc)
+    assert st.xbs[free].bound_to is site
+    assert st.xbs[bound].bound_to is None
+    # And through the objects
+    xb = st.xbs[free]
+    xb.state = 'free'
+    xb.bound_to, site.bound_to = None, None
+    assert st.xb_bound[free] == -1 and st.site_bound[site._id] == -1
+    _check_links(sarc)
+
+
+def test_axial_views(sarc):
+    st = sarc.store
+    for thick in sarc.thick:
+        assert np.shares_memory(thick.axial, st.thick_axial)
+    for thin in sarc.thin:
+        assert np.shares_memory(thin.axial, st.thin_axial)
+    thin = sarc.thin[3]
+    thin.axial = thin.axial + 1.0
+    site = thin.binding_sites[5]
+    assert site.axial_location == st.site_axial[site._id]
+    assert st.thin_axial[3, 5] == site.axial_location
+
+
+def _faces(sarc):
+    """Thin faces in the order of the store's face_sites"""
+    return [face for thin in sarc.thin for face in thin.thin_faces]
+
+
+@pytest.mark.parametrize('hiding_line', [None, 400.0])
+def test_nearest_sites_of_free_heads(sarc, hiding_line):
+    st = sarc.store
+    if hiding_line is not None:
+        sarc.hiding_line = hiding_line
+    free = np.flatnonzero(st.xb_bound < 0)
+    found = st.nearest_sites(st.xb_face[free],
+                             st.crown_axial[st.xb_node[free]],
+                             sarc.hiding_line)
+    expected = [st.xbs[i].thin_face.nearest(st.xbs[i].axial_location)._id
+                for i in free]
+    assert np.array_equal(found, expected)
+
+
+def test_nearest_sites_anywhere(sarc):
+    st = sarc.store
+    faces = _faces(sarc)
+    np.random.seed(3)
+    face = np.random.randint(len(faces), size=2000)
+    axial = np.random.uniform(-200, 1500, size=2000)
+    found = st.nearest_sites(face, axial, sarc.hiding_line)
+    expected = [faces[f].nearest(x)._id for f, x in zip(face, axial)]
+    assert np.array_equal(found, expected)
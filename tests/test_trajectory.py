@@ -0,0 +1,80 @@
+"""Round trips of trajectory files, written straight through or resumed"""
+
+import numpy as np
+from multifil import hs, trajectory
+
+
+def _record(filename, resume_at=None, steps=9, every=3, keyframe_every=100,
+            close=True):
+    """Run a sarcomere, writing a frame every so many steps, and if asked
+    carry the trajectory on with a fresh writer as a resumed run would.
+    Returns the snapshots of the frames written."""
+    sarc = hs.hs(seed=1)
+    writer = trajectory.TrajectoryWriter(filename, sarc, keyframe_every)
+    written, offset = [], None
+    for step in range(1, steps + 1):
+        sarc.timestep()
+        if step % every == 0:
+            writer.append()
+            written.append(sarc.to_snapshot())
+        if step == resume_at:
+            offset = writer.offset()
+            writer.file.close()
+            writer = trajectory.TrajectoryWriter(filename, sarc,
+                                                 offset=offset)
+    if close:
+        writer.close()
+    else:
+        writer.file.close()
+    return written
+
+
+def _frames(filename):
+    """The snapshot of each frame read back from a trajectory file"""
+    reader = trajectory.TrajectoryReader(filename)
+    return [reader.load(frame).to_snapshot() for frame in range(len(reader))]
+
+
+def test_straight_through(tmp_path):
+    filename = str(tmp_path / 'straight.traj')
+    written = _record(filename)
+    assert _frames(filename) == written
+
+
+def test_resumed_between_frames(tmp_path):
+    straight = str(tmp_path / 'straight.traj')
+    resumed = str(tmp_path / 'resumed.traj')
+    written = _record(straight)
+    assert _record(resumed, resume_at=4) == written
+    assert _frames(resumed) == written
+    index = trajectory.TrajectoryReader(resumed).index
+    assert np.array_equal(index['timestep'], [3, 6, 9])
+
+
+def test_random_access_across_keyframes(tmp_path):
+    filename = str(tmp_path / 'keyframes.traj')
+    written = _record(filename, steps=30, every=2, keyframe_every=4)
+    reader = trajectory.TrajectoryReader(filename)
+    assert np.array_equal(np.flatnonzero(reader.index['keyframe']),
+                          [0, 4, 8, 12])
+    for frame in (14, 3, 4, 9, 8, 0, 13, -1):
+        assert reader.load(frame).to_snapshot() == written[frame]
+
+
+def test_unclosed(tmp_path):
+    filename = str(tmp_path / 'unclosed.traj')
+    written = _record(filename, keyframe_every=2, close=False)
+    # A partly written last record is left out
+    with open(filename, 'ab') as tfile:
+        tfile.write(b'\x01\x02')
+    assert _frames(filename) == written
+
+
+def test_reader_leaves_random_state(tmp_path):
+    filename = str(tmp_path / 'straight.traj')
+    _record(filename)
+    np.random.seed(5)
+    expected = np.random.rand(3)
+    np.random.seed(5)
+    trajectory.TrajectoryReader(filename).load(2)
+    assert np.array_equal(np.random.rand(3), expected)